@@ -1 +1 @@
-from api.routes.ankineitor_router import router as ankineitor_router
\ No newline at end of file
+from api.routes.ankineitor_router import router as ankineitor_router, job_queue, output_store
\ No newline at end of file
@@ -0,0 +1,32 @@
+from fastapi import HTTPException, Request
+from fastapi.routing import APIRoute
+from typing import Callable
+from services.Ankineitor.payloads import PayloadTooLargeError, decompress
+
+
+class DecompressingRequest(Request):
+    """Request whose body is transparently decompressed according to Content-Encoding."""
+
+    async def body(self) -> bytes:
+        if not hasattr(self, "_body"):
+            body = await super().body()
+            encoding = self.headers.get("content-encoding", "")
+            try:
+                self._body = decompress(body, encoding) if encoding else body
+            except PayloadTooLargeError as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Could not decode request body: {e}")
+        return self._body
+
+
+class DecompressingRoute(APIRoute):
+    """Route class accepting gzip or zstd compressed request bodies."""
+
+    def get_route_handler(self) -> Callable:
+        original_route_handler = super().get_route_handler()
+
+        async def route_handler(request: Request):
+            return await original_route_handler(DecompressingRequest(request.scope, request.receive))
+
+        return route_handler
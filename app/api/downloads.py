@@ -0,0 +1,72 @@
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+import os
+
+CHUNK_SIZE = 1 << 16
+
+
+def _content_disposition(filename: str) -> str:
+    return f"attachment; filename*=utf-8''{quote(filename)}"
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single `bytes=start-end` range. Returns None if it cannot be satisfied."""
+    unit, _, spec = header.partition('=')
+    if unit.strip() != 'bytes' or ',' in spec:
+        return None
+    start, _, end = spec.strip().partition('-')
+    try:
+        if start:
+            first, last = int(start), int(end) if end else size - 1
+        else:
+            first, last = max(size - int(end), 0), size - 1
+    except ValueError:
+        return None
+    if first > last or first >= size:
+        return None
+    return first, min(last, size - 1)
+
+
+def _iter_file(path: str, start: int, length: int) -> Iterator[bytes]:
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            block = file.read(min(CHUNK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def package_response(request: Request, path: str, filename: str, etag: Optional[str] = None) -> Response:
+    """Serve a package with ETag/If-None-Match revalidation and single-range resume support."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Deck not found.")
+
+    etag = etag or f'W/"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    headers = {'ETag': etag, 'Accept-Ranges': 'bytes', 'Cache-Control': 'private, max-age=0, must-revalidate'}
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and (if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get('range')
+    if_range = request.headers.get('if-range')
+    if range_header and (if_range is None or if_range.strip() == etag):
+        byte_range = _parse_range(range_header, stat.st_size)
+        if byte_range is None:
+            return Response(status_code=416, headers={**headers, 'Content-Range': f"bytes */{stat.st_size}"})
+        start, end = byte_range
+        length = end - start + 1
+        return StreamingResponse(_iter_file(path, start, length), status_code=206, media_type="application/octet-stream", headers={
+            **headers,
+            'Content-Range': f"bytes {start}-{end}/{stat.st_size}",
+            'Content-Length': str(length),
+            'Content-Disposition': _content_disposition(filename),
+        })
+
+    return FileResponse(path, media_type="application/octet-stream", filename=filename, headers=headers, stat_result=stat)
@@ -1,15 +1,24 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-from typing import List, Dict
+from fastapi import APIRouter, File, Form, HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+from typing import Any, List, Dict, Optional, Union
 import pandas as pd
-from services.Ankineitor import DeckGenerator
+from api.compression import DecompressingRoute
+from api.downloads import package_response
+from services.Ankineitor import DeckBuildCache, DeckGenerator, DeckJobQueue, OutputStore, PayloadTooLargeError, QueueFullError, build_deck, read_dataframe_payload
+from urllib.parse import quote
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-router = APIRouter(prefix="/ankineitor")
+router = APIRouter(prefix="/ankineitor", route_class=DecompressingRoute)
+job_queue = DeckJobQueue()
+output_store = OutputStore()
+build_cache = DeckBuildCache(output_store)
+
+def deck_link(digest: str, filename: str) -> str:
+    return f"/api/v1/ankineitor/decks/{digest}?filename={quote(filename)}"
 
 class ModelField(BaseModel):
     name: str
@@ -37,29 +46,95 @@ class Config(BaseModel):
     model_builder: List[str]
 
 class DeckRequest(BaseModel):
-    dataframe: List[Dict]
+    # Row records, or the columnar form {"column": [values, ...]}
+    dataframe: Union[Dict[str, List[Any]], List[Dict]]
     config: Config
+    previous_filepath: Optional[str] = None
+
+async def queue_deck(df: pd.DataFrame, config: dict, previous_filepath: Optional[str]) -> dict:
+    """Serve a deck from the build cache, or queue its build."""
+    filename = os.path.basename(config['basics']['filename'])
+    previous = None
+    if previous_filepath:
+        # A stored package digest, or a file name in the output directory
+        previous = output_store.get(previous_filepath) or DeckGenerator.output_path(previous_filepath)
+
+    cache_key = await run_in_threadpool(DeckBuildCache.build_key, df, config, previous)
+    digest = await run_in_threadpool(build_cache.lookup, cache_key)
+    if digest:
+        return {"message": "Deck served from cache.", "cached": True, "digest": digest, "download_link": deck_link(digest, filename)}
 
-@router.post("/generate_deck", summary="Generate Anki Deck", description="Generate an Anki deck from a DataFrame and configuration.")
+    job_id = job_queue.submit(build_deck, df, config, cache_key, previous, job_queue.max_workers)
+    return {"message": "Deck generation queued.", "cached": False, "job_id": job_id, "status_link": f"/api/v1/ankineitor/jobs/{job_id}"}
+
+@router.post("/generate_deck", summary="Generate Anki Deck", description="Queue the generation of an Anki deck from a DataFrame (rows or columns) and configuration. Accepts gzip or zstd request bodies.")
 async def generate_deck(request: DeckRequest):
-    """Endpoint to generate an Anki deck."""
+    """Endpoint to queue an Anki deck build. Returns a job id to poll, or the package directly on a cache hit."""
+    if isinstance(request.dataframe, dict) and len({len(values) for values in request.dataframe.values()}) > 1:
+        lengths = ', '.join(f"{column}={len(values)}" for column, values in request.dataframe.items())
+        raise HTTPException(status_code=422, detail=f"Columns must all have the same length: {lengths}.")
+
+    try:
+        df = await run_in_threadpool(pd.DataFrame, request.dataframe)
+        return await queue_deck(df, request.config.model_dump(), request.previous_filepath)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/generate_deck_file", summary="Generate Anki Deck from File", description="Queue the generation of an Anki deck from an uploaded Parquet or Arrow IPC file (optionally .gz/.zst) and a JSON configuration.")
+async def generate_deck_file(file: UploadFile = File(...), config: str = Form(...), previous_filepath: Optional[str] = Form(None)):
+    """Endpoint to queue an Anki deck build from a columnar file upload."""
     try:
-        df = pd.DataFrame(request.dataframe)
-        config = request.config.dict()
+        deck_config = Config.model_validate_json(config).model_dump()
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
-        # Generate the deck
-        generator = DeckGenerator(df, config).generate_deck()
-        filepath = generator.get_filepath()
+    try:
+        data = await file.read()
+        df = await run_in_threadpool(read_dataframe_payload, data, file.filename)
+    except PayloadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read {file.filename}: {e}")
 
-        return {"message": "Deck generated successfully.", "download_link": f"/api/v1/download_deck?filepath={filepath}"}
+    try:
+        return await queue_deck(df, deck_config, previous_filepath)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/jobs", summary="Job Queue Status", description="Queue depth and job counts of the deck worker pool.")
+async def get_queue_status():
+    """Endpoint to inspect the job queue."""
+    return job_queue.stats()
+
+@router.get("/cache", summary="Build Cache Status", description="Hit/miss counters and size of the deck build cache.")
+async def get_cache_status():
+    """Endpoint to inspect the deck build cache."""
+    return await run_in_threadpool(build_cache.stats)
+
+@router.get("/jobs/{job_id}", summary="Job Status", description="Status of a deck generation job, with its download link once done.")
+async def get_job_status(job_id: str):
+    """Endpoint to poll a deck generation job."""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job['status'] == 'done':
+        job['download_link'] = deck_link(job['result']['digest'], job['result']['filename'])
+    return job
+
+@router.get("/decks/{digest}", summary="Download Stored Deck", description="Download a generated deck by its content digest. Supports ETag revalidation and Range requests.")
+async def download_stored_deck(request: Request, digest: str, filename: Optional[str] = None):
+    """Endpoint to download a deck from the output store."""
+    path = await run_in_threadpool(output_store.get, digest)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Deck not found or expired.")
+    return package_response(request, path, filename or f"{digest}.apkg", etag=f'"{digest}"')
+
 @router.get("/download_deck", summary="Download Anki Deck", description="Download the generated Anki deck by providing the file path.")
-async def download_deck(filepath: str):
-    """Endpoint to download the generated Anki deck."""
+async def download_deck(request: Request, filepath: str):
+    """Endpoint to download an Anki deck written directly to the output directory."""
     filepath = '/opt/output/' + filepath if os.getenv('DOCKER') else filepath
-    try:
-        return FileResponse(filepath, media_type="application/octet-stream", filename=filepath.split("/")[-1])
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Could not download the file.")
+    return package_response(request, filepath, filepath.split("/")[-1])
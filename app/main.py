@@ -15,6 +15,14 @@ app = FastAPI(title="Deck Generator API", description="API to generate Anki deck
 # Register routers
 app.include_router(ankineitor_router, prefix="/api/v1", tags=["Deck Generator"])
 
+@app.on_event("startup")
+def evict_output_store():
+    output_store.evict()
+
+@app.on_event("shutdown")
+def shutdown_job_queue():
+    job_queue.shutdown()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
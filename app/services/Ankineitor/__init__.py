@@ -1 +1,5 @@
-from services.Ankineitor.ankineitor import DeckGenerator
\ No newline at end of file
+from services.Ankineitor.ankineitor import DeckGenerator
+from services.Ankineitor.jobs import DeckJobQueue, QueueFullError, build_deck
+from services.Ankineitor.build_cache import DeckBuildCache
+from services.Ankineitor.output_store import OutputStore
+from services.Ankineitor.payloads import PayloadTooLargeError, read_dataframe_payload
\ No newline at end of file
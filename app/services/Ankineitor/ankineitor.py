@@ -1,17 +1,31 @@
 import genanki
 from loguru import logger
 import pandas as pd
+import numpy as np
 import os
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
+from services.Ankineitor.package_writer import PackageWriter
+from services.Ankineitor.incremental import DeckManifest
+from services.Ankineitor.media import MediaOptimizer, MediaStager
 
 load_dotenv()
 
+WRITERS = ('genanki', 'bulk')
+
 class DeckGenerator:
-    def __init__(self, df: pd.DataFrame, config: dict):
-        self.columns = list(df.columns)
-        self.anki_cards = df.to_dict(orient='index')
-        self.media_list = []
+    def __init__(self, df: Optional[pd.DataFrame], config: dict, writer: str = os.getenv('ANKI_WRITER', 'genanki'),
+                 optimize_media: bool = bool(os.getenv('ANKI_OPTIMIZE_MEDIA')), output_file: Optional[str] = None,
+                 concurrent_builds: int = 1):
+        if writer not in WRITERS:
+            raise ValueError(f"Unknown deck writer '{writer}', expected one of {WRITERS}.")
+        self.writer = writer
+        self.df = df
+        self.media_stager = MediaStager(optimizer=MediaOptimizer(concurrent_builds=concurrent_builds) if optimize_media else None)
+        self.media_files: Dict[str, str] = {}
         self.config = config
+        self.output_file = output_file
+        self._guids = set()
         self.model = self._create_model()
         self.deck = genanki.Deck(self.config['basics']['id'], self.config['basics']['deck_title'])
 
@@ -26,107 +40,321 @@ class DeckGenerator:
             css=self.config['model_templates']['css']
         )
 
-    def _build_media(self):
-        """Process media files and update the media list."""
-        logger.info("Building media list from the provided DataFrame.")
-        media_columns = [col for col in self.columns if 'audio' in col.lower() or 'image' in col.lower()]
-        total_cards = len(self.anki_cards)
-        processed_count = 0
-
-        for key, entry in self.anki_cards.items():
-            for media_col in media_columns:
-                try:
-                    if media_col in entry and isinstance(entry[media_col], str):
-                        filename = entry[media_col]
-                        self.media_list.append(filename)
-                        logger.info(filename)
-                        # Update media references for Anki compatibility
-                        if '.mp3' in filename:
-                            self.anki_cards[key][media_col] = f'[sound:{filename.split("/")[-1]}]'
-                        elif '.png' in filename or '.jpg' in filename:
-                            self.anki_cards[key][media_col] = filename.split("/")[-1]
-                    else:
-                        logger.debug(f"Skipping invalid media for key {key}, column {media_col}.")
-                except Exception as e:
-                    logger.error(f"Error processing media for key {key}, column {media_col}: {e}")
-            processed_count += 1
-            if processed_count % 100 == 0 or processed_count == total_cards:
-                logger.info(f"Processed {processed_count}/{total_cards} cards for media.")
-
-    def _build_tags(self, card: dict) -> list:
-        """Build tags for an Anki note based on card data."""
-        tags = []
-
-        if 'categories' in self.columns and isinstance(card.get('categories'), str):
-            tags.extend([f"课程:{i}" for i in card['categories'].split(', ')])
-
-        if 'time' in self.columns and isinstance(card.get('time'), str):
-            tags.append(f"time:{card['time']}")
-
-        if 'lesson' in self.columns and card.get('lesson') is not None:
-            tags.append(f"lesson:{card['lesson']}")
-
-        return tags
-
-    def _build_fields(self, card: dict) -> list:
-        """Build fields for an Anki note based on card data."""
-        return [card.get(field, '') for field in self.config['model_builder']]
-
-    def _create_note(self, model: genanki.Model, card: dict) -> genanki.Note:
-        """Create an Anki note based on card data."""
-        tags = self._build_tags(card)
-        fields = self._build_fields(card)
-
-        # Append additional metadata tags and fields
-        tags.extend(['@AURCODE', self.config['basics']['note_type']])
-        #fields.extend(['@AURCODE', self.config['basics']['note_type']])
-
-        return genanki.Note(
-            model=model,
-            tags=tags,
-            fields=fields
-        )
+    @staticmethod
+    def _is_str(values: pd.Series) -> pd.Series:
+        return values.map(lambda value: isinstance(value, str)).astype(bool)
 
-    def create_notes(self):
-        """Create and add notes to the deck."""
-        logger.info("Creating notes for the deck.")
-        self._build_media()
+    def _build_media_columns(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Rewrite media columns to Anki references and collect the media files, column-wise.
+
+        Media is staged first, so references point at the deduplicated, collision-free
+        file names the package will actually contain.
+        """
+        df = df.copy()
+        media_columns = [col for col in df.columns if 'audio' in col.lower() or 'image' in col.lower()]
+        is_paths = {col: self._is_str(df[col]) for col in media_columns}
+        staged = self.media_stager.stage(path for col in media_columns for path in df[col][is_paths[col]])
+        self.media_files.update((name, self.media_stager.files[name]) for name in staged.values())
+        # Most files keep their base name; only deduplicated or colliding ones need a lookup
+        renamed = {path: name for path, name in staged.items() if path != name and not path.endswith('/' + name)}
+
+        for col in media_columns:
+            values = df[col]
+            is_path = is_paths[col]
+            paths = values.where(is_path, '')
+
+            # Unreadable files keep their base name, as before
+            names = paths.str.rsplit('/', n=1).str[-1]
+            if renamed:
+                names = names.mask(paths.isin(renamed), paths.map(renamed))
+            is_audio = paths.str.contains('.mp3', regex=False)
+            is_image = ~is_audio & (paths.str.contains('.png', regex=False) | paths.str.contains('.jpg', regex=False))
+            df[col] = values.mask(is_audio, '[sound:' + names + ']').mask(is_image, names)
+            logger.info(f"Collected {int(is_path.sum())} media references from column '{col}'.")
+        return df
+
+    def _build_tag_column(self, df: pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
+        """Build the space-separated tags of every note, plus a mask of rows whose tags are valid."""
+        tags = pd.Series('', index=df.index, dtype=object)
+        valid = pd.Series(True, index=df.index)
+
+        if 'categories' in df.columns:
+            values = df['categories']
+            is_set = self._is_str(values)
+            categories = values.where(is_set, '')
+            tags = tags + (' 课程:' + categories.str.replace(', ', ' 课程:', regex=False)).where(is_set, '')
+            valid &= ~categories.str.replace(', ', '', regex=False).str.contains(' ', regex=False)
+
+        if 'time' in df.columns:
+            values = df['time']
+            is_set = self._is_str(values)
+            times = values.where(is_set, '')
+            tags = tags + (' time:' + times).where(is_set, '')
+            valid &= ~times.str.contains(' ', regex=False)
+
+        if 'lesson' in df.columns:
+            is_set = df['lesson'].notna()
+            lessons = df['lesson'].astype(str)
+            tags = tags + (' lesson:' + lessons).where(is_set, '')
+            valid &= ~(is_set & lessons.str.contains(' ', regex=False))
+
+        # Append additional metadata tags
+        tags = tags + f" @AURCODE {self.config['basics']['note_type']}"
+        return tags.str.lstrip(), valid
+
+    def _build_field_columns(self, df: pd.DataFrame) -> List[pd.Series]:
+        """Build the note fields as string columns, missing values and columns as empty strings."""
+        fields = []
+        for field in self.config['model_builder']:
+            if field in df.columns:
+                values = df[field]
+                fields.append(values.where(values.notna(), '').astype(str))
+            else:
+                fields.append(pd.Series('', index=df.index, dtype=object))
+        return fields
 
-        total_cards = len(self.anki_cards)
-        processed_count = 0
+    def _build_guid_column(self, df: pd.DataFrame, fields: List[pd.Series]) -> List[str]:
+        """Derive stable GUIDs from the word and its part of speech, so rebuilt notes update instead of duplicating.
 
-        for card_id, card_data in self.anki_cards.items():
+        Frequency tables hold one row per (word, part), so the part is part of the key when present.
+        Rows without a word fall back to genanki's default, a hash of all fields.
+        """
+        keys = fields[0].str.cat(fields[1:], sep='__') if len(fields) > 1 else fields[0]
+        if 'word' in df.columns:
+            words = df['word']
+            has_word = self._is_str(words) & words.astype(str).ne('')
+            word_keys = f"{self.config['basics']['model_name']}__" + words.astype(str)
+            if 'part' in df.columns:
+                parts = df['part']
+                has_part = self._is_str(parts) & parts.astype(str).ne('')
+                word_keys = word_keys.mask(has_part, word_keys + '__' + parts.astype(str))
+            keys = keys.mask(has_word, word_keys)
+        return [genanki.guid_for(key) for key in keys]
+
+    def _prepare_rows(self, df: pd.DataFrame) -> Tuple[List[pd.Series], pd.Series, List[str]]:
+        """Compute fields, tags and GUIDs for a frame of cards, dropping rows with invalid tags."""
+        df = self._build_media_columns(df)
+        tags, valid = self._build_tag_column(df)
+        if not valid.all():
+            logger.error(f"Skipping {int((~valid).sum())} notes with spaces inside a tag.")
+            df, tags = df[valid], tags[valid]
+        fields = self._build_field_columns(df)
+        guids = self._build_guid_column(df, fields)
+
+        # Anki merges notes sharing a GUID on import, so keep only the first of each, across chunks too
+        unique = pd.Series([guid not in self._guids for guid in guids], index=df.index) & ~pd.Series(guids, index=df.index).duplicated()
+        if not unique.all():
+            logger.warning(f"Skipping {int((~unique).sum())} notes that repeat the word (and part) of an earlier note: "
+                           f"{', '.join(df.loc[~unique, 'word'].astype(str).head(10)) if 'word' in df.columns else ''}")
+            fields, tags = [field[unique] for field in fields], tags[unique]
+            guids = [guid for guid, keep in zip(guids, unique) if keep]
+        self._guids.update(guids)
+        return fields, tags, guids
+
+    def _build_note_rows(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, List[Tuple[int, np.ndarray]]]:
+        """Compute guid, flds, sfld and tags for every note, and which card templates each note gets."""
+        fields, tags, guids = self._prepare_rows(df)
+        notes = pd.DataFrame({
+            'guid': guids,
+            'flds': fields[0].str.cat(fields[1:], sep='\x1f') if len(fields) > 1 else fields[0],
+            'sfld': fields[getattr(self.model, 'sort_field_index', 0)],
+            'tags': ' ' + tags + ' ',
+        }, index=tags.index)
+
+        cards = []
+        for card_ord, any_or_all, required_field_ords in self.model._req:
+            required = np.column_stack([fields[ord_].ne('').to_numpy() for ord_ in required_field_ords])
+            mask = required.any(axis=1) if any_or_all == 'any' else required.all(axis=1)
+            cards.append((card_ord, mask))
+        return notes, cards
+
+    def _iter_notes(self, df: pd.DataFrame) -> Iterator[genanki.Note]:
+        """Create Anki notes from the column-wise prepared fields, tags and GUIDs."""
+        fields, tags, guids = self._prepare_rows(df)
+        for card_id, card_fields, card_tags, guid in zip(tags.index, zip(*fields), tags, guids):
             try:
-                note = self._create_note(self.model, card_data)
-                self.deck.add_note(note)
+                note = genanki.Note(model=self.model, tags=card_tags.split(' '), fields=list(card_fields), guid=guid)
             except Exception as e:
                 logger.error(f"Error creating note for card ID {card_id}: {e}")
+                continue
+            yield note
+
+    def create_notes(self):
+        """Create and add notes to the deck."""
+        logger.info("Creating notes for the deck.")
+        self.media_files = {}
+        for note in self._iter_notes(self.df):
+            self.deck.add_note(note)
+        logger.info(f"Created {len(self.deck.notes)}/{len(self.df)} notes.")
+
+    def _drop_shipped(self, manifest: DeckManifest):
+        """Keep only notes and media that are new or changed since the manifest's package."""
+        total_notes, total_media = len(self.deck.notes), len(self.media_files)
+        self.deck.notes = [note for note in self.deck.notes if not manifest.is_current(note)]
+        self.media_files = {name: path for name, path in self.media_files.items() if not self._is_shipped(manifest, name)}
+        logger.info(f"Incremental update: {len(self.deck.notes)}/{total_notes} notes and {len(self.media_files)}/{total_media} media files changed.")
+
+    def _load_manifest(self, previous: Optional[str]) -> Optional[DeckManifest]:
+        """Load the manifest of the previous package and reserve its media names before staging."""
+        if not previous:
+            return None
+        manifest = DeckManifest.load(previous)
+        self.media_stager.claim(manifest.media)
+        return manifest
+
+    def _is_shipped(self, manifest: Optional[DeckManifest], name: str) -> bool:
+        return manifest is not None and manifest.has_media(name, self.media_stager.digests[name])
+
+    def _close_media(self):
+        """Shut down the media optimization pool once the package is written."""
+        if self.media_stager.optimizer is not None:
+            self.media_stager.optimizer.close()
 
-            processed_count += 1
-            if processed_count % 100 == 0 or processed_count == total_cards:
-                logger.info(f"Created {processed_count}/{total_cards} notes.")
+    def _write_chunk_bulk(self, writer: PackageWriter, df: pd.DataFrame, manifest: Optional[DeckManifest] = None):
+        """Write a chunk of rows with batched inserts, without building genanki.Note objects."""
+        if len(self.config['model_builder']) != len(self.config['model_fields']):
+            # The same check genanki runs when writing each note
+            raise ValueError(f"Number of fields in Model does not match number of fields in Note: "
+                             f"{self.config['basics']['model_name']} has {len(self.config['model_fields'])} fields, "
+                             f"but notes are built with {len(self.config['model_builder'])} fields.")
+
+        self.media_files = {}
+        notes, cards = self._build_note_rows(df)
+        for name, path in self.media_files.items():
+            if not self._is_shipped(manifest, name):
+                writer.add_media(path, name)
+
+        if manifest is not None:
+            hashes = [DeckManifest.note_hash(flds, tags) for flds, tags in zip(notes['flds'], notes['tags'])]
+            changed = np.array([manifest.notes.get(guid) != digest for guid, digest in zip(notes['guid'], hashes)], dtype=bool)
+            manifest.notes.update((guid, digest) for guid, digest, keep in zip(notes['guid'], hashes, changed) if keep)
+            notes = notes[changed]
+            cards = [(card_ord, mask[changed]) for card_ord, mask in cards]
+
+        writer.add_notes_bulk(notes, cards)
 
     def write_deck_to_file(self):
-        """Write the deck and media files to an Anki package."""
+        """Write the deck and media files to an Anki package. Raises if the package could not be written."""
         logger.info("Writing deck to file.")
         try:
-            package = genanki.Package(self.deck)
-            package.media_files = self.media_list
-            logger.info(self.media_list)
-            filepath = '/opt/output/' + self.config['basics']['filename'] if os.getenv('DOCKER') else self.config['basics']['filename']
-            package.write_to_file(filepath)
-            logger.info(f"Deck written to {filepath}.")
+            with PackageWriter(self._get_output_path(), self.deck, self.model) as writer:
+                if self.writer == 'bulk':
+                    self._write_chunk_bulk(writer, self.df)
+                for name, path in self.media_files.items():
+                    writer.add_media(path, name)
         except Exception as e:
             logger.error(f"Error writing deck to file: {e}")
+            raise
+
+    def generate_deck(self, previous: Optional[str] = None) -> 'DeckGenerator':
+        """Generate the Anki deck and return the generator.
 
-    def generate_deck(self) -> str:
-        """Generate the Anki deck and return the file name."""
+        With `previous` (the path of an earlier package of this deck) only new or
+        changed notes and newly referenced media are written. Importing the result
+        into Anki updates the existing notes, matched by their word-derived GUID.
+        """
+        try:
+            return self._generate_deck(previous)
+        finally:
+            self._close_media()
+
+    def _generate_deck(self, previous: Optional[str] = None) -> 'DeckGenerator':
         logger.info("Generating Anki deck.")
+        if self.writer == 'bulk':
+            # Notes are prepared column-wise while writing; there are no genanki.Note objects to build first
+            if previous:
+                return self.generate_deck_streaming([self.df], previous)
+            self.write_deck_to_file()
+            logger.info("Anki deck generation completed.")
+            return self
+
+        manifest = self._load_manifest(previous)
         self.create_notes()
+
+        if manifest is not None:
+            self._drop_shipped(manifest)
+            shipped_notes, shipped_media = list(self.deck.notes), list(self.media_files)
+
         self.write_deck_to_file()
+        if manifest is not None:
+            for note in shipped_notes:
+                manifest.add_note(note)
+            manifest.media.update((name, self.media_stager.digests[name]) for name in shipped_media)
+            manifest.save(self._get_output_path())
+
+        logger.info("Anki deck generation completed.")
+        return self
+
+    def generate_deck_streaming(self, chunks: Iterable[pd.DataFrame], previous: Optional[str] = None) -> 'DeckGenerator':
+        """Generate the Anki deck from DataFrame chunks, writing notes straight to the package.
+
+        Only one chunk of cards is held in memory at a time, so any iterable of
+        DataFrames works, e.g. `pd.read_csv(path, chunksize=1000)` or `iter_chunks(df)`.
+        `previous` enables incremental mode, as in `generate_deck`.
+        """
+        try:
+            return self._generate_deck_streaming(chunks, previous)
+        finally:
+            self._close_media()
+
+    def _generate_deck_streaming(self, chunks: Iterable[pd.DataFrame], previous: Optional[str] = None) -> 'DeckGenerator':
+        filepath = self._get_output_path()
+        manifest = self._load_manifest(previous)
+        logger.info(f"Streaming Anki deck to {filepath}.")
+        with PackageWriter(filepath, self.deck, self.model) as writer:
+            for chunk in chunks:
+                if self.writer == 'bulk':
+                    self._write_chunk_bulk(writer, chunk, manifest)
+                    writer.commit()
+                    logger.info(f"Streamed {writer.note_count} notes.")
+                    continue
+
+                self.media_files = {}
+                notes = list(self._iter_notes(chunk))
+
+                for name, path in self.media_files.items():
+                    if not self._is_shipped(manifest, name):
+                        writer.add_media(path, name)
+
+                for note in notes:
+                    if manifest is not None and manifest.is_current(note):
+                        continue
+                    try:
+                        writer.add_note(note)
+                    except Exception as e:
+                        logger.error(f"Error writing note {note.guid}: {e}")
+                        continue
+                    if manifest is not None:
+                        manifest.add_note(note)
+
+                writer.commit()
+                logger.info(f"Streamed {writer.note_count} notes.")
+
+            if manifest is not None:
+                manifest.media.update((name, self.media_stager.digests[name]) for name in writer.media)
+
+        if manifest is not None:
+            manifest.save(filepath)
+
+        self.media_files = {}
         logger.info("Anki deck generation completed.")
         return self
 
+    @staticmethod
+    def iter_chunks(df: pd.DataFrame, chunk_size: int = int(os.getenv('ANKI_CHUNK_SIZE', 1000))) -> Iterator[pd.DataFrame]:
+        """Split an in-memory DataFrame into chunks for streaming generation."""
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+    def _get_output_path(self) -> str:
+        """Return where the package is written on disk: `output_file` if given, else the configured file name."""
+        return self.output_file or self.output_path(self.config['basics']['filename'])
+
+    @staticmethod
+    def output_path(filename: str) -> str:
+        """Return the on-disk location of a package file name."""
+        return '/opt/output/' + filename if os.getenv('DOCKER') else filename
+
     def get_filepath(self) -> str:
         """Return the file path of the generated deck."""
         return self.config['basics']['filename']
\ No newline at end of file
@@ -0,0 +1,114 @@
+from loguru import logger
+from typing import Dict, Optional
+import pandas as pd
+import hashlib
+import json
+import os
+import threading
+from dotenv import load_dotenv
+from services.Ankineitor.media import MediaOptimizer
+from services.Ankineitor.output_store import OutputStore
+
+load_dotenv()
+
+CACHE_VERSION = 2
+
+
+class DeckBuildCache:
+    """Maps build keys to packages in the output store.
+
+    Eviction is left to the store (TTL and disk quota, least recently used first);
+    entries whose package has been evicted are dropped on lookup.
+    """
+
+    def __init__(self, store: Optional[OutputStore] = None, directory: Optional[str] = None):
+        default_directory = '/opt/output/.deck_cache' if os.getenv('DOCKER') else '.deck_cache'
+        self.store = store or OutputStore()
+        self.directory = directory or os.getenv('DECK_CACHE_PATH', default_directory)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def build_key(df: pd.DataFrame, config: dict, previous: Optional[str] = None) -> str:
+        """Hash the normalized rows, the config and the fingerprints of referenced media.
+
+        Incremental builds also depend on the previous package they are diffed against.
+        """
+        digest = hashlib.sha256()
+        digest.update(f"v{CACHE_VERSION}".encode())
+        digest.update(f"{os.getenv('ANKI_WRITER', 'genanki')}:{os.getenv('ANKI_OPTIMIZE_MEDIA', '')}".encode())
+        if os.getenv('ANKI_OPTIMIZE_MEDIA'):
+            digest.update(MediaOptimizer().settings_tag().encode())
+
+        # The file name only decides where the package lands, not what it contains.
+        basics = {key: value for key, value in config['basics'].items() if key != 'filename'}
+        digest.update(json.dumps({**config, 'basics': basics}, sort_keys=True, default=str).encode())
+
+        columns = sorted(df.columns)
+        digest.update(json.dumps(columns).encode())
+        if len(df):
+            rows = pd.util.hash_pandas_object(df[columns].astype(str), index=False)
+            digest.update(rows.values.tobytes())
+
+        media_columns = [col for col in columns if 'audio' in col.lower() or 'image' in col.lower()]
+        media_paths = set()
+        for col in media_columns:
+            media_paths.update(value for value in df[col].unique() if isinstance(value, str))
+        if previous:
+            stored = os.path.basename(previous)[:-len('.apkg')]
+            if previous.endswith('.apkg') and OutputStore.is_digest(stored):
+                # Stored packages are named after their content; their mtime changes on every read
+                digest.update(f"previous:{stored}".encode())
+            else:
+                media_paths.update([previous, previous + '.manifest.json'])
+        for path in sorted(media_paths):
+            try:
+                stat = os.stat(path)
+                digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+            except OSError:
+                digest.update(f"{path}:missing".encode())
+
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Return the digest of the cached package for `key`, or None on a miss."""
+        entry = self._entry_path(key)
+        try:
+            with open(entry, 'r') as file:
+                digest = file.read().strip()
+        except OSError:
+            digest = None
+
+        if digest and self.store.get(digest) is None:
+            os.remove(entry)
+            digest = None
+
+        with self._lock:
+            if digest:
+                self.hits += 1
+            else:
+                self.misses += 1
+        logger.info(f"Deck cache {'hit' if digest else 'miss'} for {key}.")
+        return digest
+
+    def remember(self, key: str, digest: str):
+        """Record the stored package built for `key`."""
+        tmp_path = f"{self._entry_path(key)}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w') as file:
+            file.write(digest)
+        os.replace(tmp_path, self._entry_path(key))
+        logger.info(f"Deck cached as {key}.")
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the size of the backing store."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': sum(1 for name in os.listdir(self.directory) if '.tmp-' not in name),
+            **self.store.stats(),
+        }
@@ -0,0 +1,89 @@
+import genanki
+from loguru import logger
+from typing import Dict, Optional
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import zipfile
+
+
+class DeckManifest:
+    """Note GUIDs, note content hashes and media (name -> sha1) already shipped in a package.
+
+    Saved next to incremental packages as `<package>.manifest.json` so the next
+    update can diff against it without opening the previous collection.
+    """
+
+    SUFFIX = '.manifest.json'
+
+    def __init__(self, notes: Optional[Dict[str, str]] = None, media: Optional[Dict[str, str]] = None):
+        self.notes: Dict[str, str] = dict(notes or {})
+        self.media: Dict[str, str] = dict(media or {})
+
+    @staticmethod
+    def note_hash(flds: str, tags: str) -> str:
+        """Hash a note's joined fields and space-separated tags."""
+        return hashlib.sha1(f"{flds}\x1e{tags.strip()}".encode()).hexdigest()
+
+    @classmethod
+    def _hash_note(cls, note: genanki.Note) -> str:
+        return cls.note_hash('\x1f'.join(note.fields), ' '.join(note.tags))
+
+    @classmethod
+    def load(cls, package_path: str) -> 'DeckManifest':
+        """Load the manifest of a previous package, reading the package itself if there is none."""
+        manifest_path = package_path + cls.SUFFIX
+        if os.path.isfile(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            if isinstance(data['media'], dict):
+                logger.info(f"Loaded manifest {manifest_path} with {len(data['notes'])} notes.")
+                return cls(data['notes'], data['media'])
+            # Older manifests list media names only; the package has their content
+        return cls.from_package(package_path)
+
+    @classmethod
+    def from_package(cls, package_path: str) -> 'DeckManifest':
+        """Build a manifest from the notes and media index of an .apkg file."""
+        fd, dbfile = tempfile.mkstemp(suffix='.anki2')
+        os.close(fd)
+        try:
+            with zipfile.ZipFile(package_path) as package:
+                media = {name: hashlib.sha1(package.read(member)).hexdigest()
+                         for member, name in json.loads(package.read('media')).items()}
+                with package.open('collection.anki2') as src, open(dbfile, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+
+            conn = sqlite3.connect(dbfile)
+            try:
+                notes = {guid: cls.note_hash(flds, tags) for guid, flds, tags in conn.execute('SELECT guid, flds, tags FROM notes')}
+            finally:
+                conn.close()
+        finally:
+            os.remove(dbfile)
+
+        logger.info(f"Read {len(notes)} notes from previous package {package_path}.")
+        return cls(notes, media)
+
+    def is_current(self, note: genanki.Note) -> bool:
+        """Whether the note was already shipped with the same content."""
+        return self.notes.get(note.guid) == self._hash_note(note)
+
+    def has_media(self, name: str, digest: str) -> bool:
+        """Whether a media file was already shipped under this name with the same content."""
+        return self.media.get(name) == digest
+
+    def add_note(self, note: genanki.Note):
+        self.notes[note.guid] = self._hash_note(note)
+
+    def save(self, package_path: str):
+        """Write the manifest next to its package."""
+        manifest_path = package_path + self.SUFFIX
+        tmp_path = f"{manifest_path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'notes': self.notes, 'media': dict(sorted(self.media.items()))}, file, ensure_ascii=False)
+        os.replace(tmp_path, manifest_path)
+        logger.info(f"Manifest written to {manifest_path}.")
@@ -0,0 +1,165 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from loguru import logger
+from typing import Any, Callable, Dict, Optional
+import pandas as pd
+import threading
+import time
+import uuid
+import os
+from dotenv import load_dotenv
+from services.Ankineitor.ankineitor import DeckGenerator
+from services.Ankineitor.build_cache import DeckBuildCache
+from services.Ankineitor.output_store import OutputStore
+from services.Ankineitor.incremental import DeckManifest
+
+load_dotenv()
+
+STREAMING_MIN_ROWS = int(os.getenv('ANKI_STREAMING_MIN_ROWS', 10000))
+
+
+def build_deck(df: pd.DataFrame, config: dict, cache_key: Optional[str] = None, previous: Optional[str] = None,
+               concurrent_builds: int = 1) -> Dict[str, str]:
+    """Build a deck inside a worker process, move it into the output store and return its digest and file name.
+
+    `concurrent_builds` is the size of the job pool; media optimization gets that share of the CPUs.
+    """
+    store = OutputStore()
+    # Each job writes its own file, so concurrent builds of the same deck never share a path
+    filepath = os.path.join(store.root, f".build-{uuid.uuid4().hex}.apkg")
+    try:
+        # Stream large frames so notes are not all held in memory
+        if len(df) >= STREAMING_MIN_ROWS:
+            generator = DeckGenerator(None, config, output_file=filepath, concurrent_builds=concurrent_builds).generate_deck_streaming(DeckGenerator.iter_chunks(df), previous)
+        else:
+            generator = DeckGenerator(df, config, output_file=filepath, concurrent_builds=concurrent_builds).generate_deck(previous)
+        digest = store.put(filepath)
+    finally:
+        for leftover in (filepath, filepath + DeckManifest.SUFFIX):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    if cache_key:
+        DeckBuildCache(store).remember(cache_key, digest)
+    return {'digest': digest, 'filename': os.path.basename(generator.get_filepath())}
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue cannot accept more work."""
+
+
+class DeckJobQueue:
+    """Runs deck builds in a bounded process pool and keeps track of their status."""
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None, history: Optional[int] = None):
+        self.max_workers = max_workers or int(os.getenv('DECK_WORKERS', os.cpu_count() or 1))
+        self.max_pending = max_pending or int(os.getenv('DECK_MAX_PENDING', 32))
+        self.history = history or int(os.getenv('DECK_JOB_HISTORY', 1000))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            logger.info(f"Starting deck worker pool with {self.max_workers} workers.")
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def submit(self, fn: Callable, *args) -> str:
+        """Queue a build and return its job id."""
+        with self._lock:
+            active = sum(1 for future in self._futures.values() if not future.done())
+            if active >= self.max_workers + self.max_pending:
+                raise QueueFullError(f"Job queue is full ({active} jobs active).")
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'status': 'queued',
+                'submitted_at': time.time(),
+                'finished_at': None,
+                'result': None,
+                'error': None,
+            }
+            try:
+                executor = self._get_executor()
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                # A worker died since the last job finished; start a fresh pool
+                self._reset_executor(executor)
+                executor = self._get_executor()
+                future = executor.submit(fn, *args)
+            self._futures[job_id] = future
+            self._prune()
+
+        future.add_done_callback(lambda f: self._on_done(job_id, f, executor))
+        logger.info(f"Job {job_id} queued.")
+        return job_id
+
+    def _on_done(self, job_id: str, future: Future, executor: Optional[ProcessPoolExecutor] = None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job['finished_at'] = time.time()
+            if future.cancelled():
+                job['status'] = 'cancelled'
+                return
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                # A worker was killed (e.g. out of memory): every job of this pool fails, the next submit gets a new pool
+                self._reset_executor(executor)
+            if error is None:
+                job['status'] = 'done'
+                job['result'] = future.result()
+                logger.info(f"Job {job_id} finished.")
+            else:
+                job['status'] = 'failed'
+                job['error'] = str(error)
+                logger.error(f"Job {job_id} failed: {error}")
+
+    def _reset_executor(self, executor: Optional[ProcessPoolExecutor]):
+        """Drop a broken worker pool so the next submit builds a new one. Call with the lock held."""
+        if self._executor is not None and self._executor is executor:
+            # A broken pool has already terminated its workers; shutdown() here could deadlock,
+            # since _on_done runs on the pool's management thread
+            logger.warning("Deck worker pool is broken, replacing it.")
+            self._executor = None
+
+    def _prune(self):
+        """Forget the oldest finished jobs once the history limit is exceeded."""
+        finished = [job_id for job_id, job in self._jobs.items() if job['finished_at'] is not None]
+        for job_id in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
+            del self._futures[job_id]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a snapshot of a job, or None if it is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+            if job['status'] == 'queued' and self._futures[job_id].running():
+                job['status'] = 'running'
+            return job
+
+    def stats(self) -> Dict[str, int]:
+        """Return queue depth and job counts by status."""
+        with self._lock:
+            pending = [future for future in self._futures.values() if not future.done()]
+            running = sum(1 for future in pending if future.running())
+            statuses = [job['status'] for job in self._jobs.values()]
+            return {
+                'workers': self.max_workers,
+                'queued': len(pending) - running,
+                'running': running,
+                'done': statuses.count('done'),
+                'failed': statuses.count('failed'),
+            }
+
+    def shutdown(self):
+        """Stop the worker pool, cancelling jobs that have not started."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
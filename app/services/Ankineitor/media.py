@@ -0,0 +1,249 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from loguru import logger
+from typing import Dict, Iterable, List, Optional, Tuple
+import hashlib
+import os
+import shutil
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+AUDIO_EXTENSIONS = ('.mp3',)
+
+
+def optimize_image(source: str, destination: str, max_size: int, quality: int) -> bool:
+    """Downscale an image to fit `max_size` pixels and recompress it in its own format."""
+    try:
+        from PIL import Image
+    except ImportError:
+        logger.warning("Pillow is not installed; images are packaged unoptimized.")
+        return False
+
+    with Image.open(source) as image:
+        image_format = image.format
+        image.thumbnail((max_size, max_size))
+        if image_format == 'JPEG':
+            image.convert('RGB').save(destination, format='JPEG', quality=quality, optimize=True, progressive=True)
+        else:
+            image.save(destination, format=image_format, optimize=True)
+    return True
+
+
+def optimize_audio(source: str, destination: str, bitrate: str) -> bool:
+    """Re-encode an mp3 at the target bitrate."""
+    try:
+        from pydub import AudioSegment
+    except ImportError:
+        logger.warning("pydub is not installed; audio is packaged unoptimized.")
+        return False
+
+    AudioSegment.from_file(source).export(destination, format='mp3', bitrate=bitrate)
+    return True
+
+
+def optimize_file(source: str, destination: str, max_image_size: int, image_quality: int, audio_bitrate: str) -> Optional[str]:
+    """Optimize one media file into `destination`. Returns the path to package, or None to keep the source."""
+    extension = os.path.splitext(source)[1].lower()
+    tmp_path = f"{destination}.tmp-{os.getpid()}{extension}"
+    try:
+        if extension in IMAGE_EXTENSIONS:
+            optimized = optimize_image(source, tmp_path, max_image_size, image_quality)
+        elif extension in AUDIO_EXTENSIONS:
+            optimized = optimize_audio(source, tmp_path, audio_bitrate)
+        else:
+            return None
+        if not optimized:
+            return None
+
+        # Never ship a file larger than the original
+        if os.path.getsize(tmp_path) >= os.path.getsize(source):
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, destination)
+        return destination
+    except Exception as e:
+        logger.error(f"Error optimizing media file {source}: {e}")
+        return None
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class MediaOptimizer:
+    """Downscales images and re-encodes audio in a process pool, caching results by source hash.
+
+    The pool is started on the first `optimize` call and reused until `close`, so a
+    streaming build starts it once rather than once per chunk. Without `max_workers`
+    or `MEDIA_OPTIMIZE_WORKERS` it gets an equal share of the CPUs among
+    `concurrent_builds` builds running at the same time.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_workers: Optional[int] = None, concurrent_builds: int = 1):
+        default_cache_dir = '/opt/output/.media_cache' if os.getenv('DOCKER') else '.media_cache'
+        self.cache_dir = cache_dir or os.getenv('MEDIA_CACHE_PATH', default_cache_dir)
+        default_workers = max(1, (os.cpu_count() or 1) // max(1, concurrent_builds))
+        self.max_workers = max_workers or int(os.getenv('MEDIA_OPTIMIZE_WORKERS', default_workers))
+        self.max_image_size = int(os.getenv('MEDIA_MAX_IMAGE_SIZE', 1024))
+        self.image_quality = int(os.getenv('MEDIA_IMAGE_QUALITY', 80))
+        self.audio_bitrate = os.getenv('MEDIA_AUDIO_BITRATE', '64k')
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            logger.info(f"Starting media optimization pool with {self.max_workers} workers.")
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def close(self):
+        """Shut down the worker pool; a later `optimize` call starts a new one."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def settings_tag(self) -> str:
+        """Identify the optimization settings, so changing them invalidates cached outputs."""
+        return f"{self.max_image_size}-q{self.image_quality}-{self.audio_bitrate}"
+
+    def _cache_path(self, digest: str, extension: str) -> str:
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}-{self.settings_tag()}{extension.lower()}")
+
+    def optimize(self, files: List[Tuple[str, str]]) -> Dict[str, str]:
+        """Optimize (digest, path) pairs and return digest -> optimized path for those that succeeded."""
+        optimized, pending = {}, []
+        for digest, path in files:
+            extension = os.path.splitext(path)[1].lower()
+            if extension not in IMAGE_EXTENSIONS + AUDIO_EXTENSIONS:
+                continue
+            cache_path = self._cache_path(digest, extension)
+            if os.path.isfile(cache_path):
+                optimized[digest] = cache_path
+            else:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                pending.append((digest, path, cache_path))
+
+        logger.info(f"Media optimization: {len(optimized)} cached, {len(pending)} to process.")
+        if pending:
+            try:
+                results = self._get_pool().map(optimize_file,
+                                               [path for _, path, _ in pending],
+                                               [cache_path for _, _, cache_path in pending],
+                                               [self.max_image_size] * len(pending),
+                                               [self.image_quality] * len(pending),
+                                               [self.audio_bitrate] * len(pending))
+                for (digest, _, _), result in zip(pending, results):
+                    if result:
+                        optimized[digest] = result
+            except BrokenProcessPool:
+                # A worker died; its pool cannot run anything else, so the next call starts a new one
+                self._pool = None
+                raise
+        return optimized
+
+
+class MediaStager:
+    """Deduplicates deck media by content and resolves file name collisions before packaging.
+
+    Files are hashed in parallel. Each distinct content is packaged once under one
+    name; a different file that reuses a taken name is renamed `<stem>-<hash><ext>`.
+    Names shipped in an earlier package (see `claim`) stay with the content they were
+    shipped with, whatever order the files come in.
+    Digests are kept for the life of the process by (path, size, mtime), up to
+    `MEDIA_DIGEST_CACHE_SIZE` files, so later builds only stat unchanged media.
+    """
+
+    _digest_cache: 'OrderedDict[Tuple[str, int, int], str]' = OrderedDict()
+    _digest_lock = threading.Lock()
+
+    def __init__(self, max_workers: Optional[int] = None, optimizer: Optional[MediaOptimizer] = None):
+        self.max_workers = max_workers or int(os.getenv('MEDIA_WORKERS', 8))
+        self.optimizer = optimizer
+        self.files: Dict[str, str] = {}
+        # Package name -> content digest, of the files staged here and of the names claimed
+        self.digests: Dict[str, str] = {}
+        self.claimed: Dict[str, str] = {}
+        self._names_by_digest: Dict[str, str] = {}
+        self._digests: Dict[str, Optional[str]] = {}
+        self.cache_size = int(os.getenv('MEDIA_DIGEST_CACHE_SIZE', 500000))
+
+    def claim(self, media: Dict[str, str]):
+        """Reserve names already shipped (name -> digest), so only their own content gets them."""
+        self.claimed.update(media)
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        """Hash a file in blocks, so large files are never loaded whole."""
+        digest = hashlib.sha1()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _stat_key(path: str) -> Optional[Tuple[str, int, int]]:
+        """Digest cache key of a file: its path, size and mtime."""
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            logger.error(f"Error reading media file {path}: {e}")
+            return None
+        return path, stat.st_size, stat.st_mtime_ns
+
+    def _digest(self, key: Tuple[str, int, int]) -> Optional[str]:
+        """Hash a file missing from the digest cache and remember its digest."""
+        try:
+            digest = self._hash_file(key[0])
+        except OSError as e:
+            logger.error(f"Error reading media file {key[0]}: {e}")
+            return None
+        with self._digest_lock:
+            self._digest_cache[key] = digest
+            while len(self._digest_cache) > self.cache_size:
+                self._digest_cache.popitem(last=False)
+        return digest
+
+    def stage(self, paths: Iterable[str]) -> Dict[str, str]:
+        """Return the package file name of every readable path, hashing files the process has not seen unchanged."""
+        paths = list(dict.fromkeys(paths))
+        keys = {path: self._stat_key(path) for path in paths if path not in self._digests}
+        unhashed = []
+        with self._digest_lock:
+            for path, key in keys.items():
+                digest = self._digest_cache.get(key) if key is not None else None
+                if digest is not None:
+                    self._digest_cache.move_to_end(key)
+                elif key is not None:
+                    unhashed.append(path)
+                self._digests[path] = digest
+        if unhashed:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                self._digests.update(zip(unhashed, pool.map(self._digest, [keys[path] for path in unhashed])))
+
+        names, added = {}, []
+        for path in paths:
+            digest = self._digests[path]
+            if digest is None:
+                continue
+            name = self._names_by_digest.get(digest)
+            if name is None:
+                name = os.path.basename(path)
+                if name in self.files or self.claimed.get(name, digest) != digest:
+                    stem, extension = os.path.splitext(name)
+                    name = f"{stem}-{digest[:8]}{extension}"
+                    logger.warning(f"Media name collision: {path} packaged as {name}.")
+                self._names_by_digest[digest] = name
+                self.files[name] = path
+                self.digests[name] = digest
+                added.append((digest, path))
+            names[path] = name
+
+        if self.optimizer is not None and added:
+            optimized = self.optimizer.optimize(added)
+            for digest, _ in added:
+                if digest in optimized:
+                    self.files[self._names_by_digest[digest]] = optimized[digest]
+
+        logger.info(f"Staged {len(names)} media paths as {len(set(names.values()))} distinct files.")
+        return names
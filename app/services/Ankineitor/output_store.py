@@ -0,0 +1,127 @@
+from loguru import logger
+from typing import Dict, Optional
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+from dotenv import load_dotenv
+from services.Ankineitor.incremental import DeckManifest
+
+load_dotenv()
+
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class OutputStore:
+    """Content-addressed store of generated packages, with TTL and disk-quota eviction.
+
+    Packages live at `<root>/<digest[:2]>/<digest>.apkg`, where the digest is the
+    sha256 of the package, and are touched on every read so eviction is by last use.
+    """
+
+    def __init__(self, root: Optional[str] = None, ttl: Optional[int] = None, max_bytes: Optional[int] = None):
+        default_root = '/opt/output/.store' if os.getenv('DOCKER') else '.store'
+        self.root = root or os.getenv('OUTPUT_STORE_PATH', default_root)
+        self.ttl = ttl or int(os.getenv('OUTPUT_STORE_TTL', 7 * 24 * 3600))
+        self.max_bytes = max_bytes or int(os.getenv('OUTPUT_STORE_MAX_BYTES', 10 * 1024 ** 3))
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def is_digest(value: str) -> bool:
+        return bool(DIGEST_PATTERN.match(value))
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}.apkg")
+
+    def put(self, filepath: str) -> str:
+        """Move a package (and its manifest, if any) into the store and return its digest."""
+        digest = self.hash_file(filepath)
+        destination = self.path(digest)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+        if os.path.exists(destination):
+            os.remove(filepath)
+            os.utime(destination)
+        else:
+            try:
+                os.replace(filepath, destination)
+            except OSError:
+                # Different file system: copy beside the destination, then swap in
+                tmp_path = f"{destination}.tmp-{os.getpid()}"
+                shutil.copyfile(filepath, tmp_path)
+                os.replace(tmp_path, destination)
+                os.remove(filepath)
+
+        manifest = filepath + DeckManifest.SUFFIX
+        if os.path.exists(manifest):
+            shutil.move(manifest, destination + DeckManifest.SUFFIX)
+
+        logger.info(f"Stored {filepath} as {digest}.")
+        self.evict()
+        return digest
+
+    def get(self, digest: str) -> Optional[str]:
+        """Return the path of a stored package, refreshing its last use, or None."""
+        if not self.is_digest(digest):
+            return None
+        path = self.path(digest)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def _entries(self):
+        entries = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                # Dot files are builds still being written
+                if name.endswith('.apkg') and not name.startswith('.'):
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _remove(self, path: str):
+        for target in (path, path + DeckManifest.SUFFIX):
+            if os.path.exists(target):
+                os.remove(target)
+        logger.info(f"Evicted stored package {path}.")
+
+    def evict(self):
+        """Remove packages unused for longer than the TTL, then the least recently used ones over quota."""
+        with self._lock:
+            expires = time.time() - self.ttl
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for mtime, size, path in entries:
+                if mtime >= expires and total <= self.max_bytes:
+                    break
+                try:
+                    self._remove(path)
+                    total -= size
+                except OSError as e:
+                    logger.error(f"Error evicting stored package {path}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        entries = self._entries()
+        return {
+            'packages': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+            'ttl': self.ttl,
+        }
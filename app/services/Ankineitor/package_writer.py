@@ -0,0 +1,135 @@
+import genanki
+from loguru import logger
+from typing import List, Optional, Tuple
+import pandas as pd
+import numpy as np
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import zipfile
+
+
+class PackageWriter:
+    """Write an Anki package note by note, without holding the whole deck in memory."""
+
+    def __init__(self, filepath: str, deck: genanki.Deck, model: genanki.Model, timestamp: float = None):
+        self.filepath = filepath
+        self.deck = deck
+        self.model = model
+        self.timestamp = timestamp or time.time()
+        self.id_gen = itertools.count(int(self.timestamp * 1000))
+        self.media = {}
+        self.note_count = 0
+        self._tmp_path = f"{filepath}.tmp-{os.getpid()}"
+        self._dbfile = None
+        self._conn = None
+        self._cursor = None
+        self._zip = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def open(self) -> 'PackageWriter':
+        """Create the collection database and the output archive."""
+        fd, self._dbfile = tempfile.mkstemp(suffix='.anki2')
+        os.close(fd)
+        self._conn = sqlite3.connect(self._dbfile)
+        self._cursor = self._conn.cursor()
+
+        # Schema, collection, deck and model rows, plus any notes already added to the deck
+        self.deck.add_model(self.model)
+        genanki.Package(self.deck).write_to_db(self._cursor, self.timestamp, self.id_gen)
+        self._conn.commit()
+        self.note_count = len(self.deck.notes)
+
+        self._zip = zipfile.ZipFile(self._tmp_path, 'w')
+        return self
+
+    def add_note(self, note: genanki.Note):
+        """Insert a note and its cards into the collection."""
+        note.write_to_db(self._cursor, self.timestamp, self.deck.deck_id, self.id_gen)
+        self.note_count += 1
+
+    def add_notes_bulk(self, notes: pd.DataFrame, cards: List[Tuple[int, np.ndarray]]):
+        """Insert prepared note rows and their cards with batched executemany calls.
+
+        `notes` holds the guid, flds, sfld and formatted tags columns; `cards` pairs each
+        template ordinal with a boolean mask of the notes that get a card for it. The rows
+        match what genanki's Note.write_to_db and Card.write_to_db insert one at a time.
+        """
+        count = len(notes)
+        if not count:
+            return
+        mod = int(self.timestamp)
+        note_ids = list(itertools.islice(self.id_gen, count))
+        self._cursor.executemany('INSERT INTO notes VALUES(?,?,?,?,?,?,?,?,?,?,?);', zip(
+            note_ids,
+            notes['guid'],
+            itertools.repeat(self.model.model_id),
+            itertools.repeat(mod),
+            itertools.repeat(-1),
+            notes['tags'],
+            notes['flds'],
+            notes['sfld'],
+            itertools.repeat(0),
+            itertools.repeat(0),
+            itertools.repeat(''),
+        ))
+
+        for card_ord, mask in cards:
+            card_note_ids = list(itertools.compress(note_ids, mask))
+            card_ids = itertools.islice(self.id_gen, len(card_note_ids))
+            self._cursor.executemany('INSERT INTO cards VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?);', (
+                (card_id, note_id, self.deck.deck_id, card_ord, mod, -1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, '')
+                for card_id, note_id in zip(card_ids, card_note_ids)
+            ))
+        self.note_count += count
+
+    def add_media(self, path: str, name: Optional[str] = None):
+        """Stream a media file into the archive, once per file name (its base name by default)."""
+        name = name or os.path.basename(path)
+        if name in self.media:
+            return
+        if not os.path.isfile(path):
+            logger.error(f"Media file not found: {path}")
+            return
+        index = len(self.media)
+        self._zip.write(path, str(index))
+        self.media[name] = index
+
+    def commit(self):
+        """Flush pending inserts to the collection database."""
+        self._conn.commit()
+
+    def close(self):
+        """Finish the collection and write it, with the media index, into the archive."""
+        try:
+            self._conn.commit()
+            self._conn.close()
+            self._zip.write(self._dbfile, 'collection.anki2')
+            self._zip.writestr('media', json.dumps({str(index): name for name, index in self.media.items()}))
+            self._zip.close()
+            os.replace(self._tmp_path, self.filepath)
+            logger.info(f"Package written to {self.filepath} with {self.note_count} notes and {len(self.media)} media files.")
+        finally:
+            os.remove(self._dbfile)
+
+    def abort(self):
+        """Discard the partially written package."""
+        try:
+            self._conn.close()
+            self._zip.close()
+        finally:
+            os.remove(self._dbfile)
+            if os.path.exists(self._tmp_path):
+                os.remove(self._tmp_path)
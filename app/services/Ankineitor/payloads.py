@@ -0,0 +1,75 @@
+from dotenv import load_dotenv
+from loguru import logger
+from typing import Optional
+import pandas as pd
+import gzip
+import io
+import os
+
+load_dotenv()
+
+CHUNK_SIZE = 1 << 20
+
+
+class PayloadTooLargeError(ValueError):
+    """Raised when a payload decompresses to more than the allowed size."""
+
+
+def max_decompressed_bytes() -> int:
+    return int(os.getenv('MAX_DECOMPRESSED_BYTES', 1024 ** 3))
+
+
+def decompress(data: bytes, encoding: str, max_size: Optional[int] = None) -> bytes:
+    """Decompress a gzip or zstd payload; other encodings are returned unchanged.
+
+    The output is read in chunks and decoding stops once it exceeds `max_size` bytes
+    (`MAX_DECOMPRESSED_BYTES` by default), so a small body cannot expand without bound.
+    """
+    encoding = encoding.lower().strip()
+    if encoding in ('gzip', 'x-gzip', 'gz'):
+        reader = gzip.GzipFile(fileobj=io.BytesIO(data))
+    elif encoding in ('zstd', 'zst'):
+        import zstandard
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True)
+    elif encoding not in ('', 'identity'):
+        raise ValueError(f"Unsupported content encoding: {encoding}")
+    else:
+        return data
+
+    max_size = max_size or max_decompressed_bytes()
+    output = io.BytesIO()
+    with reader:
+        for chunk in iter(lambda: reader.read(CHUNK_SIZE), b''):
+            output.write(chunk)
+            if output.tell() > max_size:
+                raise PayloadTooLargeError(f"Payload decompresses to more than {max_size} bytes.")
+    return output.getvalue()
+
+
+def read_dataframe_payload(data: bytes, filename: str) -> pd.DataFrame:
+    """Build a DataFrame from an uploaded Parquet or Arrow IPC file, optionally .gz/.zst compressed."""
+    name, extension = os.path.splitext(filename.lower())
+    if extension in ('.gz', '.zst'):
+        data = decompress(data, extension[1:])
+        name, extension = os.path.splitext(name)
+
+    if extension == '.parquet':
+        df = pd.read_parquet(io.BytesIO(data))
+    elif extension in ('.arrow', '.arrows', '.ipc', '.feather'):
+        import pyarrow as pa
+        reader = pa.ipc.open_stream(data) if extension == '.arrows' else _open_arrow(data)
+        df = reader.read_all().to_pandas()
+    else:
+        raise ValueError(f"Unsupported payload file type: {filename}")
+
+    logger.info(f"Read {len(df)} rows from payload {filename}.")
+    return df
+
+
+def _open_arrow(data: bytes):
+    """Open Arrow IPC data in either the file or the stream format."""
+    import pyarrow as pa
+    try:
+        return pa.ipc.open_file(pa.BufferReader(data))
+    except pa.ArrowInvalid:
+        return pa.ipc.open_stream(data)
@@ -0,0 +1,218 @@
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from loguru import logger
+from typing import Dict, Iterable, Optional, Set, Tuple
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+import zipfile
+
+load_dotenv()
+
+MANIFEST = 'manifest.jsonl'
+
+
+class AudioStore:
+    """Content-addressed store of synthesized audio.
+
+    Files live at `<root>/<key[:2]>/<key[2:4]>/<key>.mp3`, where the key is the sha256 of the
+    text and the voice settings, so different texts never share a file. `manifest.jsonl` lists
+    the stored keys; it is kept in memory, so lookups never touch the disk, and `refresh`
+    re-reads it once another process has changed it. Decks reference the audio as
+    `<key>.mp3`, which is what `gc` matches against.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or self.default_root()
+        self.manifest_path = os.path.join(self.root, MANIFEST)
+        self._lock = threading.Lock()
+        self._manifest_stat: Optional[Tuple[int, int, int]] = None
+        os.makedirs(self.root, exist_ok=True)
+        self.entries: Dict[str, dict] = self._load()
+        if self.entries and not os.path.exists(self.manifest_path):
+            with self._locked():
+                self._write_manifest(self.entries.values())
+
+    @staticmethod
+    def default_root() -> str:
+        """`AUDIO_STORE_PATH`, else `/opt/audio` in Docker, else `DATAFRAME_SAVE_PATH`, else `.audio_store`."""
+        if os.getenv('AUDIO_STORE_PATH'):
+            return os.getenv('AUDIO_STORE_PATH')
+        if os.getenv('DOCKER'):
+            return '/opt/audio'
+        return os.getenv('DATAFRAME_SAVE_PATH') or '.audio_store'
+
+    @staticmethod
+    def key(text: str, language: str, slow: bool = False, tld: str = 'com') -> str:
+        return hashlib.sha256(json.dumps([text, language, slow, tld], ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:4], f"{key}.mp3")
+
+    @contextmanager
+    def _locked(self):
+        """Serialize manifest writes across threads and processes."""
+        with self._lock, open(os.path.join(self.root, f"{MANIFEST}.lock"), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _stat_manifest(self) -> Optional[Tuple[int, int, int]]:
+        """Inode, mtime and size of the manifest, which change when it is appended to or replaced."""
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _load(self) -> Dict[str, dict]:
+        self._manifest_stat = self._stat_manifest()
+        if self._manifest_stat is None:
+            return self._scan()
+        entries = {}
+        with open(self.manifest_path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by a crash
+                    continue
+                entries[entry['key']] = entry
+        logger.info(f"Audio store {self.root}: {len(entries)} files in manifest.")
+        return entries
+
+    def _write_manifest(self, entries: Iterable[dict]):
+        tmp_path = f"{self.manifest_path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            for entry in entries:
+                file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.manifest_path)
+        self._manifest_stat = self._stat_manifest()
+
+    def _scan(self) -> Dict[str, dict]:
+        """Manifest entries of the audio files on disk."""
+        entries = {}
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith('.mp3') and len(name) == 68:
+                    stat = os.stat(os.path.join(directory, name))
+                    entries[name[:-4]] = {'key': name[:-4], 'bytes': stat.st_size, 'created': stat.st_mtime}
+        return entries
+
+    def rebuild(self) -> Dict[str, dict]:
+        """Recreate the manifest from the files on disk."""
+        with self._locked():
+            self.entries = self._scan()
+            self._write_manifest(self.entries.values())
+        logger.info(f"Rebuilt audio store manifest with {len(self.entries)} files.")
+        return self.entries
+
+    def refresh(self) -> bool:
+        """Reload the manifest if another process appended to or replaced it (e.g. `gc`)."""
+        with self._lock:
+            if self._stat_manifest() == self._manifest_stat:
+                return False
+            self.entries = self._load()
+        return True
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the path of stored audio, or None."""
+        return self.path(key) if key in self.entries else None
+
+    def put(self, key: str, source: str, text: str, language: str) -> str:
+        """Move a synthesized file into the store and record it in the manifest."""
+        destination = self.path(key)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(source, destination)
+        entry = {'key': key, 'text': text, 'language': language, 'bytes': os.path.getsize(destination), 'created': time.time()}
+        with self._locked():
+            unchanged = self._stat_manifest() == self._manifest_stat
+            with open(self.manifest_path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self.entries[key] = entry
+            if unchanged:
+                # Only our own line was added, so the entries in memory are still current
+                self._manifest_stat = self._stat_manifest()
+        return destination
+
+    def tmp_path(self, key: str) -> str:
+        """A scratch path on the store's file system, for synthesizing before `put`."""
+        return os.path.join(self.root, f".{key}.tmp-{os.getpid()}-{threading.get_ident()}")
+
+    def gc(self, referenced: Set[str], grace: float = 0, dry_run: bool = False) -> Dict[str, int]:
+        """Remove audio whose `<key>.mp3` name is not in `referenced`, keeping files younger than `grace` seconds."""
+        with self._locked():
+            # Pick up entries other processes appended since this store was opened
+            self.entries = self._load()
+            cutoff = time.time() - grace
+            garbage = [entry for key, entry in self.entries.items()
+                       if f"{key}.mp3" not in referenced and entry.get('created', 0) < cutoff]
+            if not dry_run:
+                for entry in garbage:
+                    path = self.path(entry['key'])
+                    try:
+                        os.remove(path)
+                        # Prune emptied shard directories; stops at the first non-empty one
+                        os.removedirs(os.path.dirname(path))
+                    except OSError:
+                        pass
+                    del self.entries[entry['key']]
+                self._write_manifest(self.entries.values())
+        stats = {'removed': len(garbage), 'bytes': sum(entry.get('bytes', 0) for entry in garbage),
+                 'kept': len(self.entries) - (len(garbage) if dry_run else 0)}
+        logger.info(f"Audio store GC{' (dry run)' if dry_run else ''}: {stats['removed']} files, {stats['bytes']} bytes removed.")
+        return stats
+
+
+def deck_media(paths: Iterable[str]) -> Optional[Set[str]]:
+    """Media names referenced by the .apkg packages in the given files and directories, or None if there are none."""
+    packages = []
+    for path in paths:
+        if os.path.isdir(path):
+            packages += [os.path.join(directory, name) for directory, _, files in os.walk(path) for name in files if name.endswith('.apkg')]
+        elif path.endswith('.apkg'):
+            packages.append(path)
+
+    media, read = set(), 0
+    for package in packages:
+        try:
+            manifest = package + '.manifest.json'
+            if os.path.isfile(manifest):
+                with open(manifest, 'r', encoding='utf-8') as file:
+                    media.update(json.load(file)['media'])
+            else:
+                with zipfile.ZipFile(package) as archive:
+                    media.update(json.loads(archive.read('media')).values())
+            read += 1
+        except Exception as e:
+            logger.error(f"Error reading media of package {package}: {e}")
+    logger.info(f"{len(media)} media files referenced by {read} packages.")
+    return media if read else None
+
+
+if __name__ == '__main__':
+    default_decks = os.getenv('OUTPUT_STORE_PATH', '/opt/output' if os.getenv('DOCKER') else '.store')
+    parser = argparse.ArgumentParser(description="Remove stored audio that no deck references anymore.")
+    parser.add_argument('command', choices=['gc', 'rebuild'])
+    parser.add_argument('--store', help="Audio store root. Defaults to AudioStore.default_root().")
+    parser.add_argument('--decks', nargs='+', default=[default_decks], help=".apkg files or directories searched for decks.")
+    parser.add_argument('--grace', type=float, default=float(os.getenv('AUDIO_GC_GRACE', 7 * 24 * 3600)),
+                        help="Keep audio created less than this many seconds ago (decks still being built).")
+    parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--allow-empty', action='store_true', help="Collect everything when no deck is found.")
+    args = parser.parse_args()
+
+    store = AudioStore(args.store)
+    if args.command == 'rebuild':
+        store.rebuild()
+    else:
+        referenced = deck_media(args.decks)
+        if referenced is None and not args.allow_empty:
+            parser.exit(1, f"No decks found in {', '.join(args.decks)}; pass --allow-empty to remove all unreferenced audio.\n")
+        store.gc(referenced or set(), grace=args.grace, dry_run=args.dry_run)
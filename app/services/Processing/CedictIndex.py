@@ -0,0 +1,132 @@
+from dotenv import load_dotenv
+from importlib import metadata
+from loguru import logger
+from typing import Dict, Iterable, List, Optional
+import pandas as pd
+import gzip
+import os
+import pickle
+import re
+import threading
+import time
+import unicodedata
+import pinyin
+import pinyin.cedict
+
+load_dotenv()
+
+# Bump whenever the layout of the serialized index changes
+INDEX_VERSION = 2
+CEDICT_LINE = re.compile(r"^([^ ]+) ([^ ]+) \[(.*)\] /(.+)/")
+CEDICT_SYLLABLE = re.compile(r"^([a-z:]+)([1-5])$")
+TONE_MARKS = ['', '\u0304', '\u0301', '\u030c', '\u0300', '']
+
+
+def diacritical(syllable: str, tone: int) -> str:
+    """Mark the tone where `pinyin.get` does: on the first a, e or o, else the first i, u or v.
+    Vowelless syllables (m, n, ng) carry it on their first letter, e.g. ḿ or ǹg."""
+    vowels = [i for i, c in enumerate(syllable) if c in 'aeo'] or [i for i, c in enumerate(syllable) if c in 'iuv'] or [0]
+    position = vowels[0] + 1
+    return unicodedata.normalize('NFC', syllable[:position] + TONE_MARKS[tone] + syllable[position:])
+
+
+class CedictIndex:
+    """Per-character pinyin and simplified-word CEDICT glosses in two plain dicts.
+
+    Built once from the `pinyin` package data and pickled to `CEDICT_INDEX_PATH`, so later
+    processes load it in a fraction of the time it takes to parse CEDICT. Lookups give the same
+    results as `pinyin.get(word, delimiter=' ')` and `pinyin.cedict.translate_word(word)`, except
+    that vowelless syllables get a tone mark (`pinyin.get` raises on them) and characters missing
+    from the pinyin data take their first CEDICT reading (嗯 -> ēn, 呣 -> ḿ).
+    """
+
+    _shared: Optional['CedictIndex'] = None
+    _lock = threading.Lock()
+
+    def __init__(self, char_pinyin: Dict[str, str], glosses: Dict[str, List[str]]):
+        self.char_pinyin = char_pinyin
+        self.glosses = glosses
+
+    @staticmethod
+    def _source() -> str:
+        return f"v{INDEX_VERSION}-pinyin-{metadata.version('pinyin')}"
+
+    @classmethod
+    def build(cls) -> 'CedictIndex':
+        """Parse the dictionaries shipped with the `pinyin` package."""
+        tones = pinyin.pinyin.pinyin_tone
+        char_pinyin = {chr(int(code, 16)): diacritical(syllable, tones[code]) for code, syllable in pinyin.pinyin.pinyin_dict.items()}
+
+        glosses, readings = {}, {}
+        path = os.path.join(os.path.dirname(pinyin.cedict.__file__), 'cedict.txt.gz')
+        with gzip.open(path, mode='rt', encoding='utf-8') as lines:
+            for line in lines:
+                if line[0] == '#':
+                    continue
+                _, simplified, reading, meaning = CEDICT_LINE.match(line).groups()
+                # Later entries win, as in pinyin.cedict
+                glosses[simplified] = meaning.split('/')
+                syllable = CEDICT_SYLLABLE.match(reading.lower())
+                if len(simplified) == 1 and not simplified.isascii() and syllable:
+                    readings.setdefault(simplified, diacritical(syllable.group(1).replace('u:', 'v'), int(syllable.group(2))))
+
+        for char, reading in readings.items():
+            char_pinyin.setdefault(char, reading)
+        return cls(char_pinyin, glosses)
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> 'CedictIndex':
+        """Load the serialized index, building and saving it if it is missing or stale."""
+        default_path = '/opt/df/cedict_index.pkl' if os.getenv('DOCKER') else 'cedict_index.pkl'
+        path = path or os.getenv('CEDICT_INDEX_PATH', default_path)
+        start = time.perf_counter()
+        try:
+            with open(path, 'rb') as file:
+                data = pickle.load(file)
+            if data['source'] == cls._source():
+                logger.info(f"CEDICT index loaded from {path} in {time.perf_counter() - start:.2f}s.")
+                return cls(data['char_pinyin'], data['glosses'])
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Error reading CEDICT index {path}: {e}")
+
+        index = cls.build()
+        try:
+            tmp_path = f"{path}.tmp-{os.getpid()}"
+            with open(tmp_path, 'wb') as file:
+                pickle.dump({'source': cls._source(), 'char_pinyin': index.char_pinyin, 'glosses': index.glosses},
+                            file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Error saving CEDICT index {path}: {e}")
+        logger.info(f"CEDICT index built in {time.perf_counter() - start:.2f}s.")
+        return index
+
+    @classmethod
+    def shared(cls) -> 'CedictIndex':
+        """Return the process-wide index, loading it on first use."""
+        if cls._shared is None:
+            with cls._lock:
+                if cls._shared is None:
+                    cls._shared = cls.load()
+        return cls._shared
+
+    def pinyin(self, word: str) -> str:
+        char_pinyin = self.char_pinyin
+        return ' '.join([char_pinyin.get(char, char) for char in word])
+
+    def translate_word(self, word: str) -> Optional[List[str]]:
+        return self.glosses.get(word)
+
+    def lookup(self, words: Iterable[str]) -> pd.DataFrame:
+        """Pinyin and CEDICT glosses (None when missing) of a word column, aligned with its index."""
+        words = words if isinstance(words, pd.Series) else pd.Series(list(words), dtype=object)
+        unique = words.unique()
+        glosses = self.glosses
+        pinyins = dict(zip(unique, [self.pinyin(word) for word in unique]))
+        meanings = dict(zip(unique, [glosses.get(word) for word in unique]))
+        return pd.DataFrame({
+            'pinyin': [pinyins[word] for word in words],
+            'meanings': [meanings[word] for word in words],
+        }, index=words.index, dtype=object)
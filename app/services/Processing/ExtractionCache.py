@@ -0,0 +1,133 @@
+from dotenv import load_dotenv
+from loguru import logger
+from typing import Iterable, List, Optional
+import pandas as pd
+import hashlib
+import io
+import json
+import os
+import pickle
+
+load_dotenv()
+
+# Bump whenever extraction or segmentation output changes, so stale entries are ignored
+EXTRACTOR_VERSION = 2
+
+
+class ExtractionCache:
+    """Caches extracted text per file and frequency tables per upload, keyed by content hash.
+
+    Entries live on local disk (`EXTRACTION_CACHE_PATH`) and, when `EXTRACTION_CACHE_MONGO`
+    is set, in the `extraction_cache` Mongo collection so every host shares them.
+    """
+
+    def __init__(self, directory: Optional[str] = None, mongo_enabled: Optional[bool] = None,
+                 collection_name: str = 'extraction_cache'):
+        default_directory = '/opt/output/.extraction_cache' if os.getenv('DOCKER') else '.extraction_cache'
+        self.directory = directory or os.getenv('EXTRACTION_CACHE_PATH', default_directory)
+        self.mongo_enabled = bool(os.getenv('EXTRACTION_CACHE_MONGO')) if mongo_enabled is None else mongo_enabled
+        self.collection_name = collection_name
+        self.field_name = 'key'
+        self._mongo = None
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def file_key(file_content: bytes, test: bool = False) -> str:
+        """Key of one file's extracted text: its content hash, the extractor version and test mode."""
+        digest = hashlib.sha256(file_content).hexdigest()
+        return f"text-v{EXTRACTOR_VERSION}-{'test' if test else 'full'}-{digest}"
+
+    @staticmethod
+    def path_key(file_path: str, test: bool = False) -> str:
+        """Same as `file_key`, hashing a file on disk in blocks."""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        return f"text-v{EXTRACTOR_VERSION}-{'test' if test else 'full'}-{digest.hexdigest()}"
+
+    @staticmethod
+    def table_key(file_keys: Iterable[str], segmenter: str = '') -> str:
+        """Key of the frequency table built from the files, in upload order, with the segmenter
+        fingerprinted by `Segmenter.fingerprint`."""
+        digest = hashlib.sha256('\n'.join([segmenter, *file_keys]).encode()).hexdigest()
+        return f"table-v{EXTRACTOR_VERSION}-{digest}"
+
+    def _path(self, key: str, extension: str) -> str:
+        return os.path.join(self.directory, f"{key}{extension}")
+
+    def _write(self, path: str, data: bytes):
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+    def _client(self):
+        if self._mongo is None:
+            from Utils import MongoDBClient
+            self._mongo = MongoDBClient()
+        return self._mongo
+
+    def _mongo_get(self, key: str) -> Optional[str]:
+        if not self.mongo_enabled:
+            return None
+        try:
+            record = self._client().find_record(key=key, collection_name=self.collection_name, field_name=self.field_name)
+            return record['data'] if record else None
+        except Exception as e:
+            logger.error(f"Error reading extraction cache entry '{key}' from MongoDB: {e}")
+            return None
+
+    def _mongo_put(self, key: str, data: str):
+        if not self.mongo_enabled:
+            return
+        try:
+            self._client().db[self.collection_name].update_one(
+                {self.field_name: key}, {'$set': {self.field_name: key, 'data': data}}, upsert=True)
+        except Exception as e:
+            logger.error(f"Error saving extraction cache entry '{key}' in MongoDB: {e}")
+
+    def get_text(self, key: str) -> Optional[List[str]]:
+        """Return the cached text blocks of a file, or None."""
+        path = self._path(key, '.json')
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Error reading extraction cache entry {path}: {e}")
+
+        data = self._mongo_get(key)
+        if data is None:
+            return None
+        # Promote to the disk tier
+        self._write(path, data.encode('utf-8'))
+        return json.loads(data)
+
+    def put_text(self, key: str, text: List[str]):
+        data = json.dumps(text, ensure_ascii=False)
+        self._write(self._path(key, '.json'), data.encode('utf-8'))
+        self._mongo_put(key, data)
+
+    def get_table(self, key: str) -> Optional[pd.DataFrame]:
+        """Return a cached frequency table, or None."""
+        path = self._path(key, '.pkl')
+        try:
+            with open(path, 'rb') as file:
+                return pickle.load(file)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Error reading extraction cache entry {path}: {e}")
+
+        data = self._mongo_get(key)
+        if data is None:
+            return None
+        df = pd.read_json(io.StringIO(data), orient='split')
+        self._write(path, pickle.dumps(df))
+        return df
+
+    def put_table(self, key: str, df: pd.DataFrame):
+        self._write(self._path(key, '.pkl'), pickle.dumps(df))
+        self._mongo_put(key, df.to_json(orient='split', force_ascii=False))
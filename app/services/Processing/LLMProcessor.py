@@ -37,19 +37,31 @@ class ChineseWordProcessor:
             mongo_client: MongoDBClient = MongoDBClient(),
             api_client: GroqAPIClient = GroqAPIClient(),
             max_retries: int = 3,
+            flush_size: Optional[int] = None,
         ):
         self.mongo_client = mongo_client
         self.collection_name = 'llm_inference'
         self.field_name = 'word' #'hanzi'
         self.api_client = api_client
         self.max_retries = max_retries
+        self.flush_size = flush_size
+        self.columns = ['example_sentences', 'improved_meaning']
 
     def process_word(self, word: str, previous_meaning: Optional[str] = None) -> Dict[str, str]:
         """
         Generates example sentences and improved meaning for a given Chinese word.
         """
-        logger.info(f"Processing word: {word}")
         existing_record = self.mongo_client.find_record(key=word, collection_name=self.collection_name, field_name=self.field_name)
+        result, generated = self._process_word(word, previous_meaning, existing_record)
+        if generated:
+            self.mongo_client.bulk_upsert(records=[result], columns=self.columns, collection_name=self.collection_name, field_name=self.field_name)
+        return result
+
+    def _process_word(self, word: str, previous_meaning: Optional[str], existing_record: Optional[Dict]) -> tuple[Dict[str, str], bool]:
+        """
+        Completes the stored record of a word, returning it and whether anything had to be generated.
+        """
+        logger.info(f"Processing word: {word}")
 
         example_sentences = existing_record.get('example_sentences') if existing_record else None
         improved_meaning = existing_record.get('improved_meaning') if existing_record else None
@@ -61,7 +73,7 @@ class ChineseWordProcessor:
                 "example_sentences": example_sentences,
                 "improved_meaning": improved_meaning,
                 #"pinyin": 'f'
-            }
+            }, False
 
         # Generate example sentences
         if not example_sentences:
@@ -71,16 +83,13 @@ class ChineseWordProcessor:
         if not improved_meaning:
             improved_meaning = self._generate_improved_meaning(word, previous_meaning)
 
-        # Save to DB
         result = {
             "word": word,
             "example_sentences": example_sentences,
             "improved_meaning": improved_meaning
         }
-
-        self.mongo_client.insert_record(record=result, columns=['example_sentences', 'improved_meaning'], collection_name=self.collection_name, field_name=self.field_name)
         logger.info(f"Word {word} processed successfully.")
-        return result
+        return result, True
 
     def _generate_example_sentences(self, word: str) -> str:
         """
@@ -114,10 +123,17 @@ class ChineseWordProcessor:
         Process a list of Chinese words and return the results in a DataFrame.
         """
         results = []
-        for word in words:
-            previous_meaning = previous_meanings.get(word) if previous_meanings else None
-            result = self.process_word(word, previous_meaning)
-            results.append(result)
+        existing_records = self.mongo_client.find_records(keys=words, collection_name=self.collection_name,
+                                                          field_name=self.field_name, columns=self.columns)
+        # Save to DB in bulk writes
+        with self.mongo_client.bulk_writer(columns=self.columns, collection_name=self.collection_name,
+                                           field_name=self.field_name, flush_size=self.flush_size) as writer:
+            for word in words:
+                previous_meaning = previous_meanings.get(word) if previous_meanings else None
+                result, generated = self._process_word(word, previous_meaning, existing_records.get(word))
+                if generated:
+                    writer.add(result)
+                results.append(result)
 
         # Convert results to DataFrame
         df = pd.DataFrame(results)
@@ -1,57 +1,32 @@
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
+import codecs
+import mmap
 import os
 import io
 import re
+import tempfile
 import PyPDF2
-from typing import List, Union, Dict
+from typing import Iterable, Iterator, List, Optional, Tuple, Union, Dict
 from pptx import Presentation
 import pandas as pd
-import jieba.posseg as pseg
 from loguru import logger
+from Processing.ExtractionCache import ExtractionCache
+from Processing.Segmenter import Segmenter
 
 # Load environment variables
 load_dotenv()
 
-import hashlib
-
-'''class MongoHandler:
-    def __init__(self, collection_name: str = 'file_results'):
-        self.client = MongoDBClient()
-        self.collection_name = collection_name
-        self.field_name = "file_hash"
-
-    def get_result(self, file_name: str) -> Union[None, pd.DataFrame]:
-        """Retrieve the result from MongoDB if it already exists."""
-        file_hash = self._get_file_hash(file_name)
-        result = self.client.find_record(key=file_hash,
-                                         collection_name=self.collection_name,
-                                         field_name=self.field_name)
-        if result:
-            # Convert the stored result back to a DataFrame
-            return pd.read_json(result['data'])
-        return None
-
-    def save_result(self, file_name: str, df: pd.DataFrame):
-        """Save the processing results into MongoDB."""
-        file_hash = self._get_file_hash(file_name)
-        data = df.to_json()  # Save the DataFrame as JSON
-        record = {self.field_name: file_hash, "data": data}
+CHINESE_PATTERN = re.compile(r'[\u4E00-\u9FFF]+')
+# Sentence breaks: after 。！？?, ...... or …… unless a closing quote follows, and after a closing quote
+SENTENCE_BREAK_PATTERN = re.compile(r"(?<=[。！？?])(?=[^”'])|(?<=\.{6})(?=[^”'])|(?<=…{2})(?=[^”'])|(?<=[。！？?][”'])(?=[^，。！？?])")
+# Longest lookbehind of SENTENCE_BREAK_PATTERN, plus one
+SENTENCE_LOOKBEHIND = 8
+
+# PDF readers opened by this extraction worker, by file path
+_worker_pdf_readers: Dict[str, PyPDF2.PdfReader] = {}
 
-        try:
-            self.client.insert_record(
-                record=record,
-                columns=["file_name", "data"],
-                collection_name="results",
-                field_name="file_name"
-            )
-            logger.info(f"Record for '{file_hash}' saved in MongoDB.")
-        except Exception as e:
-            logger.error(f"Error saving record for '{file_hash}' in MongoDB: {e}")
-
-    def _get_file_hash(self, file_name: str) -> str:
-        """Generate a unique hash for the file."""
-        return hashlib.md5(file_name.encode()).hexdigest()
-'''
 
 class FileHandler:
     """Handles extraction of text from different file formats."""
@@ -60,12 +35,12 @@ class FileHandler:
         self.file_content = file_content
         self.test = test
 
-    def extract_text(self, file_name: str) -> List[str]:
-        """Dispatch to the correct method based on file extension."""
+    def extract_text(self, file_name: str, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        """Dispatch to the correct method based on file extension. `start`/`stop` select PDF pages."""
         file_extension = file_name.lower().split('.')[-1]
 
         if file_extension == 'pdf':
-            return self._extract_text_from_pdf()
+            return self._extract_text_from_pdf(start, stop)
         elif file_extension == 'pptx':
             return self._extract_text_from_pptx()
         elif file_extension == 'txt':
@@ -73,21 +48,93 @@ class FileHandler:
         else:
             raise ValueError(f"Unsupported file type: {file_extension}")
 
+    @staticmethod
+    def iter_text_from_path(file_path: str, test: bool = False, chunk_size: int = 1 << 20) -> Iterator[str]:
+        """Stream the text of a file on disk: TXT in chunks of about `chunk_size` bytes, PDF and PPTX page by page."""
+        file_extension = file_path.lower().split('.')[-1]
+
+        if file_extension == 'pdf':
+            return FileHandler._iter_pdf_pages(file_path, test)
+        elif file_extension == 'pptx':
+            return FileHandler._iter_pptx_slides(file_path, test)
+        elif file_extension == 'txt':
+            return FileHandler._iter_txt_chunks(file_path, chunk_size)
+        else:
+            raise ValueError(f"Unsupported file type: {file_extension}")
+
+    @staticmethod
+    def _iter_txt_chunks(file_path: str, chunk_size: int) -> Iterator[str]:
+        """Decode a memory-mapped txt file incrementally, yielding chunks that end on a line break."""
+        if os.path.getsize(file_path) == 0:
+            return
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        pending = ''
+        with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for offset in range(0, len(data), chunk_size):
+                pending += decoder.decode(data[offset:offset + chunk_size])
+                # Ending chunks on a line break keeps words and sentences whole
+                cut = pending.rfind('\n') + 1
+                if cut:
+                    yield pending[:cut]
+                    pending = pending[cut:]
+                elif len(pending) >= chunk_size * 4:
+                    yield pending
+                    pending = ''
+        pending += decoder.decode(b'', final=True)
+        if pending:
+            yield pending
+
+    @staticmethod
+    def _iter_pdf_pages(file_path: str, test: bool = False) -> Iterator[str]:
+        """Yield the text of each PDF page, reading the file lazily instead of loading it whole."""
+        with open(file_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            num_pages = len(pdf_reader.pages)
+            for page_num in range(min(3, num_pages) if test else num_pages):
+                yield pdf_reader.pages[page_num].extract_text()
+
+    @staticmethod
+    def _iter_pptx_slides(file_path: str, test: bool = False) -> Iterator[str]:
+        """Yield the text runs of each slide, one slide at a time."""
+        presentation = Presentation(file_path)
+        max_page = 3 if test else len(presentation.slides)
+        for slide in presentation.slides[:max_page]:
+            yield '\n'.join(run.text
+                            for shape in slide.shapes if shape.has_text_frame
+                            for paragraph in shape.text_frame.paragraphs
+                            for run in paragraph.runs)
+
     def _extract_text_from_txt(self) -> List[str]:
         """Extract text from a txt file."""
         text = self.file_content.decode('utf-8')
         return [text]
 
-    def _extract_text_from_pdf(self) -> List[str]:
-        """Extract text from a PDF file."""
-        pdf_file = io.BytesIO(self.file_content)
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
+    def count_pages(self) -> int:
+        """Number of PDF pages to extract, limited to 3 in test mode.
+
+        Read from the page tree's /Count, so the pages themselves are not loaded.
+        """
+        pdf_reader = PyPDF2.PdfReader(io.BytesIO(self.file_content))
+        try:
+            num_pages = int(pdf_reader.trailer['/Root']['/Pages']['/Count'])
+        except Exception:
+            num_pages = len(pdf_reader.pages)
+        return min(3, num_pages) if self.test else num_pages
+
+    def _extract_text_from_pdf(self, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        """Extract text from the pages [start, stop) of a PDF file."""
+        return self.pdf_pages_text(PyPDF2.PdfReader(io.BytesIO(self.file_content)), self.test, start, stop)
+
+    @staticmethod
+    def pdf_pages_text(pdf_reader: PyPDF2.PdfReader, test: bool = False, start: int = 0, stop: Optional[int] = None) -> List[str]:
+        """Extract text from the pages [start, stop) of an open PDF."""
         text = []
         num_pages = len(pdf_reader.pages)
 
         # Optionally limit the pages for testing purposes
-        max_page = 3 if self.test else num_pages
-        for page_num in range(min(max_page, num_pages)):
+        max_page = 3 if test else num_pages
+        stop = min(max_page, num_pages) if stop is None else min(stop, max_page, num_pages)
+        for page_num in range(start, stop):
             page = pdf_reader.pages[page_num]
             text.append(page.extract_text())
 
@@ -109,81 +156,250 @@ class FileHandler:
         return text
 
 
+def extract_file_text(file_name: str, file_content: bytes, test: bool = False, start: int = 0, stop: Optional[int] = None) -> List[str]:
+    """Extract one file, or one page range of a PDF."""
+    return FileHandler(file_content, test).extract_text(file_name, start, stop)
+
+
+def init_extraction_worker():
+    """Process pool initializer: start each worker without open PDF readers."""
+    _worker_pdf_readers.clear()
+
+
+def extract_path_text(file_name: str, file_path: str, test: bool = False, start: int = 0, stop: Optional[int] = None) -> List[str]:
+    """Extract one spooled file, or one page range of a PDF, in a worker process.
+
+    A worker parses each PDF once and keeps the reader for the other page ranges it is given.
+    """
+    if file_name.lower().endswith('.pdf'):
+        pdf_reader = _worker_pdf_readers.get(file_path)
+        if pdf_reader is None:
+            pdf_reader = _worker_pdf_readers[file_path] = PyPDF2.PdfReader(file_path)
+        return FileHandler.pdf_pages_text(pdf_reader, test, start, stop)
+    with open(file_path, 'rb') as file:
+        return extract_file_text(file_name, file.read(), test, start, stop)
+
+
 class TextExtractor:
     """Class responsible for text extraction and processing from uploaded files."""
 
-    def __init__(self, uploaded_files: Dict[str, bytes], dev_enabled: bool = os.getenv('DEBUG')):
+    def __init__(self, uploaded_files: Dict[str, bytes], dev_enabled: bool = os.getenv('DEBUG'), max_workers: Optional[int] = None,
+                 cache: Optional[ExtractionCache] = None):
         self.dev_enabled = dev_enabled
         self.uploaded_files = uploaded_files
+        self.max_workers = max_workers or int(os.getenv('EXTRACTION_WORKERS', os.cpu_count() or 1))
+        self.pages_per_task = int(os.getenv('EXTRACTION_PAGES_PER_TASK', 16))
+        self.segment_chunk_size = int(os.getenv('SEGMENT_CHUNK_SIZE', 100000))
+        self.read_chunk_size = int(os.getenv('EXTRACTION_READ_CHUNK_SIZE', 1 << 20))
+        self.cache = cache if cache is not None else ExtractionCache()
+        self.file_keys = {file_name: ExtractionCache.file_key(file_content, bool(dev_enabled))
+                          for file_name, file_content in uploaded_files.items()}
+        self.file_paths: List[str] = []
         self.text: Union[str, List[str]] = []
         self.phrases: List[str] = []
 
+    @classmethod
+    def from_paths(cls, file_paths: List[str], dev_enabled: bool = os.getenv('DEBUG'),
+                   cache: Optional[ExtractionCache] = None) -> 'TextExtractor':
+        """Build a file-backed extractor that streams the files instead of holding them in memory.
+
+        Its text is never materialized: `separated_chinese_characters` and `extract_phrases`
+        read it through `iter_text`, so memory depends on the chunk size, not the file size.
+        """
+        extractor = cls({}, dev_enabled, cache=cache)
+        extractor.file_paths = list(file_paths)
+        extractor.file_keys = {file_path: ExtractionCache.path_key(file_path, bool(dev_enabled))
+                               for file_path in extractor.file_paths}
+        return extractor
+
+    def iter_text(self) -> Iterator[str]:
+        """Yield the text of the files on disk, block by block."""
+        for file_path in self.file_paths:
+            yield from FileHandler.iter_text_from_path(file_path, self.dev_enabled, self.read_chunk_size)
+
+    def _text_blocks(self) -> Union[str, Iterable[str]]:
+        """The extracted text, or a stream of it for file-backed extractors."""
+        return self.iter_text() if self.file_paths and not self.text else self.text
+
+    def _plan_tasks(self, file_names: List[str]) -> List[Tuple[str, int, Optional[int]]]:
+        """Split the files into (file name, start, stop) tasks, large PDFs by page range."""
+        tasks = []
+        for file_name in file_names:
+            if file_name.lower().endswith('.pdf'):
+                num_pages = FileHandler(self.uploaded_files[file_name], self.dev_enabled).count_pages()
+                starts = range(0, num_pages, self.pages_per_task) or [0]
+                # The last range is open-ended, in case /Count undercounts the pages
+                tasks.extend((file_name, start, start + self.pages_per_task) for start in starts[:-1])
+                tasks.append((file_name, starts[-1], None))
+            else:
+                tasks.append((file_name, 0, None))
+        return tasks
+
+    def _spool(self, directory: str, file_names: List[str]) -> Dict[str, str]:
+        """Write the files to `directory`, so worker tasks are sent a path instead of the whole content."""
+        file_paths = {}
+        for position, file_name in enumerate(file_names):
+            file_paths[file_name] = os.path.join(directory, f"{position}-{os.path.basename(file_name)}")
+            with open(file_paths[file_name], 'wb') as file:
+                file.write(self.uploaded_files[file_name])
+        return file_paths
+
     def extract_text(self):
-        """Extract text from all uploaded files."""
-        for file_name, file_content in self.uploaded_files.items():
-            file_handler = FileHandler(file_content, self.dev_enabled)
-            file_text = file_handler.extract_text(file_name)
-            self.text.extend(file_text)
+        """Extract text from all uploaded files, fanning files and PDF page ranges out to a process pool.
+
+        Files whose content was extracted before are read from the cache instead.
+        """
+        file_texts = {}
+        for file_name, key in self.file_keys.items():
+            cached = self.cache.get_text(key)
+            if cached is not None:
+                file_texts[file_name] = cached
+
+        missing = [file_name for file_name in self.uploaded_files if file_name not in file_texts]
+        # A single worker reads each file whole, so PDFs are only split for a pool
+        tasks = self._plan_tasks(missing) if self.max_workers > 1 else [(file_name, 0, None) for file_name in missing]
+        for file_name in missing:
+            file_texts[file_name] = []
+
+        if len(tasks) > 1 and self.max_workers > 1:
+            with tempfile.TemporaryDirectory() as directory, \
+                    ProcessPoolExecutor(max_workers=min(self.max_workers, len(tasks)), initializer=init_extraction_worker) as pool:
+                file_paths = self._spool(directory, missing)
+                # map yields results in task order, so pages are reassembled in document order
+                results = pool.map(extract_path_text,
+                                   [file_name for file_name, _, _ in tasks],
+                                   [file_paths[file_name] for file_name, _, _ in tasks],
+                                   [self.dev_enabled] * len(tasks),
+                                   [start for _, start, _ in tasks],
+                                   [stop for _, _, stop in tasks])
+                for (file_name, _, _), file_text in zip(tasks, results):
+                    file_texts[file_name].extend(file_text)
+        else:
+            for file_name, start, stop in tasks:
+                file_texts[file_name].extend(extract_file_text(file_name, self.uploaded_files[file_name], self.dev_enabled, start, stop))
+
+        for file_name in missing:
+            self.cache.put_text(self.file_keys[file_name], file_texts[file_name])
+        for file_name in self.uploaded_files:
+            self.text.extend(file_texts[file_name])
+        logger.info(f"Extracted {len(self.text)} text blocks from {len(self.uploaded_files)} files "
+                    f"({len(self.uploaded_files) - len(missing)} cached, {len(tasks)} tasks).")
         self.text = '。'.join(self.text)
 
     def separated_chinese_characters(self, phrases=False) -> pd.DataFrame:
         """Separate and return Chinese characters along with their frequency and part-of-speech."""
-        chinese_regex = r'[\u4E00-\u9FFF]+'
-        chinese_characters = '。'.join(re.findall(chinese_regex, self.text))
-        seg_list = list(pseg.cut(chinese_characters, use_paddle=True))
+        if phrases:
+            self.phrases = self.extract_phrases()
 
-        # Create a DataFrame from the segmented list
-        df = pd.DataFrame(set(seg_list), columns=["word", "part"])
-        df = df[df['word'] != '。']
-        df = df.groupby('word')['part'].agg(lambda x: ', '.join(x)).reset_index()
+        table_key = ExtractionCache.table_key(self.file_keys.values(), Segmenter.fingerprint())
+        cached = self.cache.get_table(table_key)
+        if cached is not None:
+            logger.info(f"Frequency table served from cache ({len(cached)} words).")
+            return cached
 
-        df_aux = pd.DataFrame(seg_list, columns=["word", "part"])
-        df_aux['frequency'] = df_aux['word'].map(df_aux['word'].value_counts())
+        df = self.count_words(self.iter_chinese_chunks(self._text_blocks(), self.segment_chunk_size))
+        self.cache.put_table(table_key, df)
+        return df
 
-        if phrases:
-            self.phrases = self.extract_phrases()
+    @staticmethod
+    def iter_chinese_chunks(text: Union[str, Iterable[str]], chunk_size: int = 100000) -> Iterator[str]:
+        """Yield the Chinese runs of the text joined by '。', in chunks of about `chunk_size` characters.
+
+        Chunks only break between runs, so jieba segments them exactly as it would the whole text.
+        """
+        blocks = [text] if isinstance(text, str) else text
+        runs, size = [], 0
+        for block in blocks:
+            for match in CHINESE_PATTERN.finditer(block):
+                runs.append(match.group())
+                size += len(runs[-1]) + 1
+                if size >= chunk_size:
+                    yield '。'.join(runs)
+                    runs, size = [], 0
+        if runs:
+            yield '。'.join(runs)
 
-        # Merge frequency data and return cleaned DataFrame
-        return pd.merge(df, df_aux, on='word', how='left')[['word', 'part_x', 'frequency']] \
-            .drop_duplicates(subset='word') \
-            .rename(columns={'part_x': 'part'}) \
-            .sort_values(by='frequency', ascending=False) \
-            .reset_index(drop=True)
+    @staticmethod
+    def count_words(chunks: Iterable[str]) -> pd.DataFrame:
+        """Segment the chunks in one pass, counting each word and collecting its parts of speech."""
+        segmenter = Segmenter.shared()
+        frequencies = Counter()
+        parts: Dict[str, Dict[str, None]] = {}
+        for chunk in chunks:
+            for word, part in segmenter.cut(chunk):
+                frequencies[word] += 1
+                # A dict keeps the parts in first-seen order
+                parts.setdefault(word, {})[part] = None
+        frequencies.pop('。', None)
+
+        df = pd.DataFrame({
+            'word': list(frequencies.keys()),
+            'part': [', '.join(parts[word]) for word in frequencies],
+            'frequency': list(frequencies.values()),
+        })
+        return df.sort_values(by='frequency', ascending=False, kind='stable').reset_index(drop=True)
 
     def extract_phrases(self, split_n: int = 12, min_characters_n: int = 6) -> List[str]:
-        """Extract meaningful phrases from text."""
-        text_new = self._format_text(self.text, split_n)
-        para = self._apply_text_formatting(text_new)
-        return [i for i in para if len(i) >= min_characters_n and re.search(r'[\u4e00-\u9fff]+', i)]
-
-    def _apply_text_formatting(self, text: str) -> List[str]:
-        """Apply common text formatting (split by punctuation)."""
-        para = re.sub(r"([。！？\?])([^”'])", r"\1\n\2", text)
-        para = re.sub(r"(\.{6})([^”'])", r"\1\n\2", para)
-        para = re.sub(r"(\…{2})([^”'])", r"\1\n\2", para)
-        para = re.sub(r"([。！？\?][”'])([^，。！？\?])", r'\1\n\2', para)
-        para = para.rstrip()
-        para = list(set(para.split("\n")))
-        return para
-
-    def _format_text(self, text: str, split_n: int) -> str:
-        """Format text into smaller segments."""
-        lines = text.split('\n')
-        result = []
-        current_line = ''
+        """Extract meaningful phrases from the whole text."""
+        return list(self.iter_phrases(split_n, min_characters_n))
+
+    def iter_phrases(self, split_n: int = 12, min_characters_n: int = 6) -> Iterator[str]:
+        """Yield each distinct phrase of at least `min_characters_n` characters containing Chinese, in document order."""
+        seen = set()
+        for sentence in self._iter_sentences(self._iter_lines(self._text_blocks()), split_n):
+            sentence = sentence.strip()
+            if len(sentence) >= min_characters_n and sentence not in seen and CHINESE_PATTERN.search(sentence):
+                seen.add(sentence)
+                yield sentence
 
+    @staticmethod
+    def _iter_lines(text: Union[str, Iterable[str]]) -> Iterator[str]:
+        """Yield the lines of a string, or of each block of an iterable, without materializing them."""
+        blocks = [text] if isinstance(text, str) else text
+        for block in blocks:
+            for line in io.StringIO(block, newline='\n'):
+                yield line.rstrip('\n')
+
+    @staticmethod
+    def _iter_formatted(lines: Iterable[str], split_n: int) -> Iterator[str]:
+        """Keep short lines on their own and join each longer line to the text after it."""
+        current_line = ''
         for line in lines:
             if len(current_line) > split_n:
-                result.append(current_line + line)
+                yield current_line + line
                 current_line = ''
             elif len(line) <= split_n:
-                result.append(line + '\n')
+                yield line + '\n'
             else:
                 current_line = line
-
         if current_line:
-            result.append(current_line)
-        return ''.join(result)[:2000]
+            yield current_line
+
+    def _iter_sentences(self, lines: Iterable[str], split_n: int) -> Iterator[str]:
+        """Split the formatted text into sentences, yielding each one as soon as it is complete.
+
+        Gives the same pieces as `SENTENCE_BREAK_PATTERN.split` on every line, but only the new text
+        is searched for breaks and emitted text is dropped, so long lines stay linear and bounded.
+        """
+        buffer, start = '', 0
+        for piece in self._iter_formatted(lines, split_n):
+            # Formatted pieces only carry a line break at their end
+            line_end = piece.endswith('\n')
+            # A break at the old end could not match until the character after it arrived
+            scan_from = max(len(buffer), 1)
+            buffer += piece[:-1] if line_end else piece
+            for match in SENTENCE_BREAK_PATTERN.finditer(buffer, scan_from):
+                yield buffer[start:match.start()]
+                start = match.start()
+            if line_end:
+                yield buffer[start:]
+                buffer, start = '', 0
+            elif start > SENTENCE_LOOKBEHIND:
+                # Keep enough emitted text for the pattern's lookbehinds
+                keep = start - SENTENCE_LOOKBEHIND
+                buffer, start = buffer[keep:], start - keep
+        if buffer:
+            yield buffer[start:]
 
     @staticmethod
     def read_files_to_uploaded(file_paths: List[str]) -> Dict[str, bytes]:
@@ -1,77 +1,120 @@
 from loguru import logger
-from deep_translator import GoogleTranslator
 from gtts import gTTS
 from datetime import datetime
 from dotenv import load_dotenv
-from typing import List, Optional
+from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 import pandas as pd
 import numpy as np
 import os
+import random
 import re
-import pinyin
-import pinyin.cedict
+import time
 #from opencc import OpenCC
 
 from Utils import MongoDBClient
+from Processing.TranslationEngine import TranslationEngine
+from Processing.WordCache import WordCache
+from Processing.CedictIndex import CedictIndex
+from Processing.AudioStore import AudioStore
 load_dotenv()
 
 class AudioCreator:
-    def __init__(self, folder_name: str = None, language: str = 'zh'):
+    def __init__(self, folder_name: str = None, language: str = 'zh', workers: Optional[int] = None,
+                 retries: Optional[int] = None, backoff: Optional[float] = None, slow: bool = False, tld: str = 'com',
+                 store: Optional[AudioStore] = None):
         """
         AudioCreator class to generate audio files from text.
 
         Args:
-            folder_name (str): Path to the folder where audio files will be saved. Defaults to `AUDIO_PATH` environment variable.
+            folder_name (str): Root of the audio store. Defaults to `AudioStore.default_root()`.
             language (str): Language for text-to-speech. Defaults to 'zh' (Chinese).
+            workers (int): Concurrent text-to-speech requests. Defaults to `AUDIO_WORKERS` or 8.
+            retries (int): Retries of a failed request. Defaults to `AUDIO_RETRIES` or 3.
+            backoff (float): Seconds before the first retry, doubled on each retry. Defaults to `AUDIO_BACKOFF` or 1.
+            slow (bool): gTTS slow speech.
+            tld (str): gTTS top-level domain, which selects the accent.
+            store: AudioStore holding the audio files. Defaults to one rooted at `folder_name`, opened on first use.
         """
-        self.folder_name: str = '/opt/audio/' if os.getenv('DOCKER') else os.getenv('DATAFRAME_SAVE_PATH') if folder_name else folder_name
+        self.folder_name: str = folder_name or AudioStore.default_root()
         self.language: str = language
-        self.paths: List[str] = []
-
-    def _sanitize_text(self, text: str) -> str:
+        self.workers: int = workers or int(os.getenv('AUDIO_WORKERS', 8))
+        self.retries: int = retries if retries is not None else int(os.getenv('AUDIO_RETRIES', 3))
+        self.backoff: float = backoff if backoff is not None else float(os.getenv('AUDIO_BACKOFF', 1.0))
+        self.slow: bool = slow
+        self.tld: str = tld
+        self._store: Optional[AudioStore] = store
+        self.paths: List[Optional[str]] = []
+
+    @property
+    def store(self) -> AudioStore:
+        if self._store is None:
+            self._store = AudioStore(self.folder_name)
+        return self._store
+
+    def _key(self, text: str) -> str:
+        """Store key of the audio of a text with this creator's voice settings."""
+        return AudioStore.key(text, self.language, self.slow, self.tld)
+
+    def _create_audio(self, text: str, key: str) -> Optional[str]:
         """
-        Sanitize input text to create a valid filename.
+        Generate the audio file of a text into the store, retrying with backoff.
 
         Args:
-            text (str): Input text to sanitize.
+            text (str): Text to convert to speech.
+            key (str): Store key of the audio.
 
         Returns:
-            str: Sanitized text.
+            str: Path of the created audio file.
         """
-        return ''.join(re.findall(r'[\u4e00-\u9fffa-zA-Z0-9]+', text))[:30]
-
-    def _create_audio(self, text: str, file_path: str) -> str:
+        tmp_file = self.store.tmp_path(key)
+        for attempt in range(self.retries + 1):
+            try:
+                speech = gTTS(text=text, lang=self.language, slow=self.slow, tld=self.tld)
+                speech.save(tmp_file)
+                audio_file = self.store.put(key, tmp_file, text, self.language)
+                logger.info(f"Audio created: {audio_file}")
+                return audio_file
+            except Exception as e:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+                if attempt == self.retries:
+                    logger.error(f"Error creating audio for text '{text}' after {attempt + 1} attempts: {e}")
+                    return None
+                delay = self.backoff * 2 ** attempt * (0.5 + random.random())
+                logger.warning(f"Error creating audio for text '{text}' ({e}), retrying in {delay:.2f}s.")
+                time.sleep(delay)
+
+    def create_audio_map(self, texts: List[str]) -> Dict[str, Optional[str]]:
         """
-        Generate an audio file for the given text if it doesn't already exist.
+        Generate audio files for the distinct texts concurrently, reusing stored ones.
 
         Args:
-            text (str): Text to convert to speech.
-            file_path (str): Path where the audio file will be saved.
+            texts (List[str]): List of texts to convert to speech.
 
         Returns:
-            str: Path of the created or existing audio file.
+            Dict[str, Optional[str]]: Path of the audio file of each text, None where none could be created.
         """
-        if not text:
-            return None
-
-        if not re.search(r'[\u4e00-\u9fffa-zA-Z0-9]', text):
-            return None
-
-        audio_file = f"{file_path}-{self.language}.mp3"
-        if os.path.exists(audio_file):
-            return audio_file
-
-        try:
-            speech = gTTS(text=text, lang=self.language, slow=False)
-            speech.save(audio_file)
-            logger.info(f"Audio created: {audio_file}")
-            return audio_file
-        except Exception as e:
-            logger.error(f"Error creating audio for text '{text}': {e}")
-            return None
-
-    def create_audios(self, texts: List[str]) -> List[str]:
+        texts = [text for text in dict.fromkeys(texts)
+                 if isinstance(text, str) and re.search(r'[\u4e00-\u9fffa-zA-Z0-9]', text)]
+        keys = {text: self._key(text) for text in texts}
+        # Once per call: a gc in another process may have removed stored audio
+        self.store.refresh()
+        # Cache checks are lookups in the in-memory manifest
+        audio_map = {text: self.store.get(key) for text, key in keys.items()}
+        missing = [text for text, path in audio_map.items() if path is None]
+
+        logger.info(f"Starting audio file creation: {len(texts) - len(missing)} stored, {len(missing)} to create...")
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='audio') as executor:
+            futures = {executor.submit(self._create_audio, text, keys[text]): text for text in missing}
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Audio creation"):
+                audio_map[futures[future]] = future.result()
+
+        logger.info(f"Audio file creation complete. {sum(path is not None for path in audio_map.values())} of {len(texts)} files available.")
+        return audio_map
+
+    def create_audios(self, texts: List[str]) -> List[Optional[str]]:
         """
         Generate audio files for a list of texts.
 
@@ -79,19 +122,10 @@ class AudioCreator:
             texts (List[str]): List of texts to convert to speech.
 
         Returns:
-            List[str]: List of paths to the generated audio files.
+            List[Optional[str]]: Path of the audio file of each text, aligned with `texts` (None where none could be created).
         """
-        os.makedirs(self.folder_name, exist_ok=True)
-        logger.info("Starting audio file creation...")
-
-        for text in tqdm(texts, desc="Audio creation"):
-            sanitized_name = self._sanitize_text(text)
-            file_path = os.path.join(self.folder_name, sanitized_name)
-            audio_file = self._create_audio(text, file_path)
-            if audio_file:
-                self.paths.append(audio_file)
-
-        logger.info(f"Audio file creation complete. {len(self.paths)} files generated.")
+        audio_map = self.create_audio_map(texts)
+        self.paths = [audio_map.get(text) if isinstance(text, str) else None for text in texts]
         return self.paths
 
 class DataTransformer:
@@ -107,7 +141,11 @@ class DataTransformer:
             lan_in: str = 'zh-CN',
             lan_out: str = 'es',
             mongo_client: MongoDBClient = MongoDBClient(),
-            audio_creator: AudioCreator = AudioCreator()
+            audio_creator: AudioCreator = AudioCreator(),
+            flush_size: Optional[int] = None,
+            translation_engine: Optional[TranslationEngine] = None,
+            cache: Optional[WordCache] = None,
+            cedict: Optional[CedictIndex] = None
         ):
         """
         DataTransformer class for processing Chinese words.
@@ -124,6 +162,10 @@ class DataTransformer:
             lan_out (str): Output language for translation.
             mongo_client: MongoDB client for database operations.
             audio_creator: AudioCreator instance for generating audio files.
+            flush_size (int): Records buffered per bulk write to DB. Defaults to `MONGO_FLUSH_SIZE`.
+            translation_engine: TranslationEngine used for translations. Defaults to one for `lan_in` -> `lan_out`.
+            cache: WordCache with the pinyin and translations of processed words. Defaults to one backed by `mongo_client`.
+            cedict: CedictIndex for pinyin and extra meanings. Defaults to the shared index.
         """
         self.traditional_enabled = traditional_enabled
         self.pinyin_enabled = pinyin_enabled
@@ -141,7 +183,10 @@ class DataTransformer:
         self.collection_name = 'hanzi_processing'
         self.field_name = 'word'
         self.audio_creator = audio_creator
-
+        self.flush_size = flush_size
+        self.translation_engine = translation_engine or TranslationEngine(lan_in=lan_in, lan_out=lan_out)
+        self.cache = cache or WordCache(mongo_client=mongo_client, collection_name=self.collection_name, field_name=self.field_name)
+        self.cedict = cedict or CedictIndex.shared()
 
     def _determine_columns(self) -> List[str]:
         """
@@ -180,39 +225,35 @@ class DataTransformer:
     def _generate_audio(self, df: pd.DataFrame) -> pd.DataFrame:
         if self.audio_enabled and self.audio_creator:
             logger.info("Generating audio files for hanzi.")
-            self.audio_creator.create_audios(list(df['word']))
-            df['audio'] = self.audio_creator.paths
+            df['audio'] = self.audio_creator.create_audios(list(df['word']))
         return df
 
-    def _translate_word(self, word: str) -> str:
+    def _add_extra_meanings(self, translation: Optional[str], extra_meanings: Optional[List[str]]) -> Optional[str]:
         """
-        Translate a word using Google Translator and include extra meanings.
+        Append the CEDICT meanings of a word to its translation.
         """
-        translator = GoogleTranslator(source=self.lan_in, target=self.lan_out)
-        translation = translator.translate(word, src=self.lan_in, dest=self.lan_out)
-        extra_meanings = pinyin.cedict.translate_word(word)
+        if translation is None:
+            return None
         if extra_meanings:
             translation += f". Extra meanings: {' | '.join(extra_meanings)}"
         return translation
 
-    def _transform_row(self, row: pd.Series) -> pd.Series:
+    def _merge_cached_records(self, df: pd.DataFrame) -> pd.DataFrame:
         """
-        Transform a single row of data.
+        Fetch the cached pinyin and translation of every word and merge them column-wise.
+        Adds a boolean `_cached` column marking the words that need no transformation.
         """
-        logger.info(f"Transforming row for hanzi: {row['word']}")
-        if self.translation_enabled:
-            row['translation'] = self._translate_word(row['word'])
-
-        if self.pinyin_enabled:
-            row['pinyin'] = pinyin.get(row['word'], delimiter=" ")
-
-        if self.save_enabled and self.pinyin_enabled and self.translation_enabled:
-            self.mongo_client.insert_record(record=row.to_dict(), columns=['pinyin', 'translation', 'timestamp'], collection_name=self.collection_name, field_name=self.field_name)
-
-        logger.info(f'Create a new register for {row['word']}')
-        logger.info(f'translation: {row['translation']}')
-        logger.info(f'translation: {row['pinyin']}')
-        return row
+        records = self.cache.get_many(df['word'].tolist(), self.lan_in, self.lan_out)
+        cached = pd.DataFrame.from_dict(records, orient='index', columns=['pinyin', 'translation'])
+
+        complete = pd.Series(True, index=df.index)
+        for column in ['pinyin', 'translation']:
+            values = df['word'].map(cached[column])
+            complete &= values.fillna('').astype(bool)
+            if column in df.columns:
+                df[column] = values.where(values.notna(), df[column])
+        df['_cached'] = complete
+        return df
 
     def transform_data(self, words: List[str]) -> pd.DataFrame:
         """
@@ -237,21 +278,30 @@ class DataTransformer:
         df = self._convert_to_traditional(df)
 
 
-        for index, row in tqdm(df.iterrows(), total=df.shape[0]):
-            existing_record = self.mongo_client.find_record(key=row['word'], collection_name=self.collection_name, field_name=self.field_name)
-            if existing_record:
-                for column in ['pinyin', 'translation']:
-                    row[column] = existing_record.get(column, row.get(column))
-                if row['pinyin'] and row['translation']:
-                    logger.info(f'{row["word"]} has already been processed previously. {row["pinyin"]} {row["translation"]}')
-                    df.loc[index] = row
-                    continue
-
-            row = self._transform_row(row)
-            df.loc[index] = row
+        df = self._merge_cached_records(df)
+        misses = df.index[~df['_cached']]
+        df = df.drop(columns='_cached')
+        logger.info(f"{len(df) - len(misses)} words already processed previously, {len(misses)} to transform.")
+
+        # Pinyin and CEDICT meanings of every new word in one offline lookup
+        offline = self.cedict.lookup(df.loc[misses, 'word'])
+        if self.pinyin_enabled:
+            df.loc[misses, 'pinyin'] = offline['pinyin']
+
+        if self.translation_enabled:
+            # Translations arrive concurrently, in completion order, and fill every row of their word
+            rows_by_word = df.loc[misses].groupby('word', sort=False).groups
+            with self.cache.writer(self.lan_in, self.lan_out, mongo=self.save_enabled, flush_size=self.flush_size) as save:
+                for word, translation in tqdm(self.translation_engine.translate_many(rows_by_word), total=len(rows_by_word)):
+                    rows = rows_by_word[word]
+                    df.loc[rows, 'translation'] = self._add_extra_meanings(translation, offline.at[rows[0], 'meanings'])
+                    logger.info(f"Create a new register for {word}: {df.at[rows[0], 'translation']}")
+                    if self.pinyin_enabled and translation is not None:
+                        save(df.loc[rows[0]].to_dict())
 
         df = self._generate_audio(df)
-        self.mongo_client.delete_duplicates(collection_name=self.collection_name, field_name=self.field_name)
+        if self.save_enabled and self.cache.mongo_enabled:
+            self.mongo_client.delete_duplicates(collection_name=self.collection_name, field_name=self.field_name)
 
         logger.info(f"Data transformation complete. DataFrame is {len(df)}")
         return df[self.columns]
@@ -0,0 +1,114 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from deep_translator import GoogleTranslator
+from dotenv import load_dotenv
+from loguru import logger
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+import os
+import random
+import threading
+import time
+
+load_dotenv()
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a token is available. A rate of 0 or less is unlimited."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class StubTranslator:
+    """Offline stand-in for `GoogleTranslator` with a fixed latency and an optional failure rate."""
+
+    def __init__(self, source: str = 'zh-CN', target: str = 'es', latency: float = 0.05, failure_rate: float = 0.0):
+        self.source = source
+        self.target = target
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random()
+
+    def translate(self, text: str, **kwargs) -> str:
+        time.sleep(self.latency)
+        if self.random.random() < self.failure_rate:
+            raise ConnectionError(f"Stub translation of '{text}' failed")
+        return f"[{self.target}] {text}"
+
+
+class TranslationEngine:
+    """Translates word lists concurrently.
+
+    Words are deduplicated and sent through a pool of `TRANSLATION_WORKERS` threads. Each thread
+    reuses its own translator. Requests are limited to `TRANSLATION_RATE` per second
+    (bursts of `TRANSLATION_BURST`), and failed requests are retried `TRANSLATION_RETRIES` times
+    with exponential backoff starting at `TRANSLATION_BACKOFF` seconds.
+    """
+
+    def __init__(
+            self,
+            lan_in: str = 'zh-CN',
+            lan_out: str = 'es',
+            translator_factory: Optional[Callable[[str, str], object]] = None,
+            workers: Optional[int] = None,
+            rate: Optional[float] = None,
+            burst: Optional[float] = None,
+            retries: Optional[int] = None,
+            backoff: Optional[float] = None
+        ):
+        self.lan_in = lan_in
+        self.lan_out = lan_out
+        self.translator_factory = translator_factory or (lambda source, target: GoogleTranslator(source=source, target=target))
+        self.workers = workers or int(os.getenv('TRANSLATION_WORKERS', 8))
+        self.bucket = TokenBucket(rate if rate is not None else float(os.getenv('TRANSLATION_RATE', 5)),
+                                  burst or float(os.getenv('TRANSLATION_BURST', 0)) or None)
+        self.retries = retries if retries is not None else int(os.getenv('TRANSLATION_RETRIES', 3))
+        self.backoff = backoff if backoff is not None else float(os.getenv('TRANSLATION_BACKOFF', 0.5))
+        self._local = threading.local()
+
+    def _translator(self):
+        """The calling thread's translator, created on first use."""
+        translator = getattr(self._local, 'translator', None)
+        if translator is None:
+            translator = self._local.translator = self.translator_factory(self.lan_in, self.lan_out)
+        return translator
+
+    def translate(self, word: str) -> Optional[str]:
+        """Translate one word, retrying with backoff. Returns None once the retries are exhausted."""
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            try:
+                return self._translator().translate(word)
+            except Exception as e:
+                if attempt == self.retries:
+                    logger.error(f"Error translating '{word}' after {attempt + 1} attempts: {e}")
+                    return None
+                delay = self.backoff * 2 ** attempt * (0.5 + random.random())
+                logger.warning(f"Error translating '{word}' ({e}), retrying in {delay:.2f}s.")
+                time.sleep(delay)
+
+    def translate_many(self, words: Iterable[str]) -> Iterator[Tuple[str, Optional[str]]]:
+        """Yield (word, translation) for each distinct word as soon as its translation arrives."""
+        words = list(dict.fromkeys(words))
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='translation') as executor:
+            futures = {executor.submit(self.translate, word): word for word in words}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
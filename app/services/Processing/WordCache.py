@@ -0,0 +1,269 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from loguru import logger
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import os
+import sqlite3
+import threading
+import time
+
+load_dotenv()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS words (
+    lan_in TEXT,
+    lan_out TEXT,
+    word TEXT,
+    pinyin TEXT,
+    translation TEXT,
+    updated_at REAL,
+    PRIMARY KEY (lan_in, lan_out, word)
+) WITHOUT ROWID;
+"""
+
+# Records saved before language pairs were stored are DataTransformer's default pair
+LEGACY_PAIR = ('zh-CN', 'es')
+# Fields of a word that depend on the language pair, kept per pair in Mongo
+PAIR_FIELDS = ['pinyin', 'translation', 'timestamp']
+TIERS = ['memory', 'disk', 'mongo']
+# Below SQLite's bound parameter limit
+DISK_BATCH_SIZE = 900
+
+
+class WordCache:
+    """Pinyin and translation of words per language pair in three tiers.
+
+    Lookups go to a bounded in-process LRU (`WORD_CACHE_SIZE` entries), then a local SQLite
+    store (`WORD_CACHE_PATH`), then the `hanzi_processing` Mongo collection unless
+    `WORD_CACHE_MONGO=0`. Hits are copied to the faster tiers, and writes go to all of them.
+    Only complete entries, with both pinyin and translation, count as hits.
+
+    Mongo keeps one record per word, with each pair under `translations.<lan_in>:<lan_out>`;
+    the top-level pinyin and translation of older records still serve their own pair.
+    """
+
+    def __init__(self, mongo_client=None, path: Optional[str] = None, max_size: Optional[int] = None,
+                 mongo_enabled: Optional[bool] = None, collection_name: str = 'hanzi_processing', field_name: str = 'word'):
+        default_path = '/opt/df/word_cache.sqlite' if os.getenv('DOCKER') else 'word_cache.sqlite'
+        self.path = path or os.getenv('WORD_CACHE_PATH', default_path)
+        self.max_size = max_size or int(os.getenv('WORD_CACHE_SIZE', 100000))
+        self.mongo_enabled = os.getenv('WORD_CACHE_MONGO', '1') != '0' if mongo_enabled is None else mongo_enabled
+        self.mongo_client = mongo_client
+        self.collection_name = collection_name
+        self.field_name = field_name
+
+        self._memory: 'OrderedDict[Tuple[str, str, str], Dict[str, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = dict.fromkeys(TIERS, 0)
+        self.misses = dict.fromkeys(TIERS, 0)
+
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def _client(self):
+        if self.mongo_client is None:
+            from Utils import MongoDBClient
+            self.mongo_client = MongoDBClient()
+        return self.mongo_client
+
+    @staticmethod
+    def _complete(record: Optional[Dict[str, Any]]) -> bool:
+        return bool(record and record.get('pinyin') and record.get('translation'))
+
+    @staticmethod
+    def _pair_field(lan_in: str, lan_out: str) -> str:
+        return f"translations.{lan_in}:{lan_out}"
+
+    @staticmethod
+    def _mongo_pair_filter(lan_in: str, lan_out: str) -> Dict[str, Any]:
+        """Matches the older records that keep the pair's translation at the top level."""
+        pair = {'lan_in': lan_in, 'lan_out': lan_out}
+        if (lan_in, lan_out) != LEGACY_PAIR:
+            return pair
+        return {'$or': [pair, {'lan_in': {'$exists': False}, 'lan_out': {'$exists': False}}]}
+
+    def _count(self, tier: str, hits: int, misses: int):
+        with self._lock:
+            self.hits[tier] += hits
+            self.misses[tier] += misses
+
+    # Memory tier
+    def _memory_get(self, key: Tuple[str, str, str]) -> Optional[Dict[str, str]]:
+        with self._lock:
+            record = self._memory.get(key)
+            if record is not None:
+                self._memory.move_to_end(key)
+            return record
+
+    def _memory_put(self, key: Tuple[str, str, str], record: Dict[str, str]):
+        with self._lock:
+            self._memory[key] = record
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    # Disk tier
+    def _disk_get(self, words: List[str], lan_in: str, lan_out: str) -> Dict[str, Dict[str, str]]:
+        records = {}
+        with self._connect() as connection:
+            for start in range(0, len(words), DISK_BATCH_SIZE):
+                batch = words[start:start + DISK_BATCH_SIZE]
+                rows = connection.execute(
+                    f"SELECT word, pinyin, translation FROM words WHERE lan_in = ? AND lan_out = ? "
+                    f"AND word IN ({', '.join('?' * len(batch))})", (lan_in, lan_out, *batch))
+                for word, pinyin, translation in rows:
+                    records[word] = {'pinyin': pinyin, 'translation': translation}
+        return records
+
+    def _disk_put(self, records: Dict[str, Dict[str, str]], lan_in: str, lan_out: str):
+        now = time.time()
+        with self._connect() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO words VALUES (?, ?, ?, ?, ?, ?)',
+                [(lan_in, lan_out, word, record['pinyin'], record['translation'], now) for word, record in records.items()])
+
+    # Mongo tier
+    def _mongo_get(self, words: List[str], lan_in: str, lan_out: str) -> Dict[str, Dict[str, str]]:
+        pair = f"{lan_in}:{lan_out}"
+        records = self._client().find_records(keys=words, collection_name=self.collection_name, field_name=self.field_name,
+                                              columns=['pinyin', 'translation', 'lan_in', 'lan_out', self._pair_field(lan_in, lan_out)])
+        found = {}
+        for word, record in records.items():
+            entry = record.get('translations', {}).get(pair)
+            if entry is None and (record.get('lan_in', LEGACY_PAIR[0]), record.get('lan_out', LEGACY_PAIR[1])) == (lan_in, lan_out):
+                entry = record
+            if entry is not None:
+                found[word] = {'pinyin': entry.get('pinyin'), 'translation': entry.get('translation')}
+        return found
+
+    def get_many(self, words: Iterable[str], lan_in: str, lan_out: str) -> Dict[str, Dict[str, str]]:
+        """Return word -> {'pinyin', 'translation'} for the distinct words found complete in any tier."""
+        missing = list(dict.fromkeys(words))
+        found = {}
+
+        for word in missing:
+            record = self._memory_get((lan_in, lan_out, word))
+            if record is not None:
+                found[word] = record
+        self._count('memory', len(found), len(missing) - len(found))
+        missing = [word for word in missing if word not in found]
+
+        tiers = [('disk', self._disk_get)] + ([('mongo', self._mongo_get)] if self.mongo_enabled else [])
+        for position, (tier, lookup) in enumerate(tiers):
+            if not missing:
+                break
+            records = {word: record for word, record in lookup(missing, lan_in, lan_out).items() if self._complete(record)}
+            self._count(tier, len(records), len(missing) - len(records))
+            if records:
+                # Promote to the faster tiers
+                if tier == 'mongo':
+                    self._disk_put(records, lan_in, lan_out)
+                for word, record in records.items():
+                    self._memory_put((lan_in, lan_out, word), record)
+            found.update(records)
+            missing = [word for word in missing if word not in records]
+
+        logger.info(f"Word cache: {len(found)} hits, {len(missing)} misses. "
+                    + ', '.join(f"{tier} {metric['hit_rate']:.0%}" for tier, metric in self.metrics().items()))
+        return found
+
+    @contextmanager
+    def writer(self, lan_in: str, lan_out: str, mongo: bool = True, flush_size: Optional[int] = None):
+        """Context manager yielding a function that saves a record (word, pinyin, translation, ...) to every tier.
+        The memory tier is written at once, disk and Mongo in batches of `flush_size`."""
+        pending = {}
+        flush_size = flush_size or int(os.getenv('MONGO_FLUSH_SIZE', 500))
+        pair_field = self._pair_field(lan_in, lan_out)
+        pair_columns = [f"{pair_field}.{field}" for field in PAIR_FIELDS]
+        with (self._client().bulk_writer(columns=pair_columns,
+                                         collection_name=self.collection_name, field_name=self.field_name,
+                                         flush_size=flush_size)
+              if mongo and self.mongo_enabled else _NullWriter()) as mongo_writer:
+            def add(record: Dict[str, Any]):
+                entry = {'pinyin': record['pinyin'], 'translation': record['translation']}
+                self._memory_put((lan_in, lan_out, record[self.field_name]), entry)
+                pending[record[self.field_name]] = entry
+                mongo_writer.add({
+                    **{key: value for key, value in record.items() if key not in PAIR_FIELDS},
+                    **{f"{pair_field}.{field}": record[field] for field in PAIR_FIELDS if field in record},
+                })
+                if len(pending) >= flush_size:
+                    self._disk_put(pending, lan_in, lan_out)
+                    pending.clear()
+
+            yield add
+            if pending:
+                self._disk_put(pending, lan_in, lan_out)
+
+    def invalidate(self, word: str, lan_in: Optional[str] = None, lan_out: Optional[str] = None):
+        """Forget the pinyin and translation of a word in every tier, for one language pair or all of them."""
+        with self._lock:
+            for key in [key for key in self._memory if key[2] == word and (lan_in is None or key[:2] == (lan_in, lan_out))]:
+                del self._memory[key]
+        with self._connect() as connection:
+            if lan_in is None:
+                connection.execute('DELETE FROM words WHERE word = ?', (word,))
+            else:
+                connection.execute('DELETE FROM words WHERE lan_in = ? AND lan_out = ? AND word = ?', (lan_in, lan_out, word))
+        if self.mongo_enabled:
+            pair_field = self._pair_field(lan_in, lan_out) if lan_in is not None else 'translations'
+            self._mongo_unset({self.field_name: word}, [pair_field], many=False)
+            query = {self.field_name: word, **(self._mongo_pair_filter(lan_in, lan_out) if lan_in is not None else {})}
+            self._mongo_unset(query, ['pinyin', 'translation', 'lan_in', 'lan_out'], many=False)
+        logger.info(f"Invalidated cached word '{word}'" + (f" for {lan_in} -> {lan_out}." if lan_in else "."))
+
+    def invalidate_pair(self, lan_in: str, lan_out: str):
+        """Forget every cached word of a language pair in every tier."""
+        with self._lock:
+            for key in [key for key in self._memory if key[:2] == (lan_in, lan_out)]:
+                del self._memory[key]
+        with self._connect() as connection:
+            connection.execute('DELETE FROM words WHERE lan_in = ? AND lan_out = ?', (lan_in, lan_out))
+        if self.mongo_enabled:
+            pair_field = self._pair_field(lan_in, lan_out)
+            self._mongo_unset({pair_field: {'$exists': True}}, [pair_field], many=True)
+            self._mongo_unset(self._mongo_pair_filter(lan_in, lan_out), ['pinyin', 'translation', 'lan_in', 'lan_out'], many=True)
+        logger.info(f"Invalidated cached words for {lan_in} -> {lan_out}.")
+
+    def _mongo_unset(self, query: Dict[str, Any], fields: List[str], many: bool):
+        collection = self._client().db[self.collection_name]
+        update = {'$unset': dict.fromkeys(fields, '')}
+        try:
+            result = collection.update_many(query, update) if many else collection.update_one(query, update)
+            logger.info(f"Cleared {result.modified_count} records in '{self.collection_name}'.")
+        except Exception as e:
+            logger.error(f"Error invalidating records in '{self.collection_name}': {e}")
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """Hits, misses and hit rate of each tier since start-up."""
+        with self._lock:
+            return {
+                tier: {'hits': self.hits[tier], 'misses': self.misses[tier],
+                       'hit_rate': self.hits[tier] / (self.hits[tier] + self.misses[tier]) if self.hits[tier] + self.misses[tier] else 0.0}
+                for tier in TIERS if tier != 'mongo' or self.mongo_enabled
+            }
+
+
+class _NullWriter:
+    """Stands in for the Mongo bulk writer when the Mongo tier is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def add(self, record):
+        pass
@@ -1,3 +1,9 @@
 from Processing.TextExtractor import TextExtractor
 from Processing.TextProcessor import DataTransformer
-from Processing.LLMProcessor import ChineseWordProcessor
\ No newline at end of file
+from Processing.LLMProcessor import ChineseWordProcessor
+from Processing.ExtractionCache import ExtractionCache
+from Processing.Segmenter import Segmenter
+from Processing.TranslationEngine import TranslationEngine, StubTranslator
+from Processing.WordCache import WordCache
+from Processing.CedictIndex import CedictIndex
+from Processing.AudioStore import AudioStore
\ No newline at end of file
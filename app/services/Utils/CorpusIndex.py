@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import time
+import pandas as pd
+from contextlib import contextmanager
+from typing import Optional
+from dotenv import load_dotenv
+from loguru import logger
+
+load_dotenv()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    doc_id TEXT UNIQUE,
+    name TEXT,
+    added_at REAL,
+    words INTEGER
+);
+CREATE TABLE IF NOT EXISTS contributions (
+    document INTEGER,
+    word TEXT,
+    part TEXT,
+    frequency INTEGER,
+    PRIMARY KEY (document, word, part)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS totals (
+    word TEXT,
+    part TEXT,
+    frequency INTEGER,
+    PRIMARY KEY (word, part)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS totals_frequency ON totals (frequency DESC);
+"""
+
+
+class CorpusIndex:
+    """Persistent (word, part) frequency index over ingested documents.
+
+    Each document's contribution is stored next to the running totals, so documents can be
+    added or removed incrementally and top-N queries read the totals through an index.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        default_path = '/opt/df/corpus_index.sqlite' if os.getenv('DOCKER') else 'corpus_index.sqlite'
+        self.path = path or os.getenv('CORPUS_INDEX_PATH', default_path)
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        """One connection per call, committed on success, so the index can be used from any thread."""
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _aggregate(df: pd.DataFrame) -> pd.DataFrame:
+        """Sum the frequency of each (word, part) of a frequency table."""
+        df = df[['word', 'part', 'frequency']].copy()
+        df['part'] = df['part'].fillna('').astype(str)
+        df['frequency'] = pd.to_numeric(df['frequency'], errors='coerce').fillna(0).astype('int64')
+        df = df.dropna(subset=['word'])
+        # Sorted rows insert in primary-key order
+        return df.groupby(['word', 'part'], as_index=False)['frequency'].sum()
+
+    def has_document(self, doc_id: str) -> bool:
+        with self._connect() as connection:
+            return connection.execute('SELECT 1 FROM documents WHERE doc_id = ?', (doc_id,)).fetchone() is not None
+
+    def add_document(self, doc_id: str, df: pd.DataFrame, name: Optional[str] = None):
+        """Add a document's frequency table (word, part, frequency), replacing an earlier version of it."""
+        rows = self._aggregate(df)
+        with self._connect() as connection:
+            self._remove(connection, doc_id)
+            document = connection.execute('INSERT INTO documents (doc_id, name, added_at, words) VALUES (?, ?, ?, ?)',
+                                          (doc_id, name or doc_id, time.time(), len(rows))).lastrowid
+            connection.executemany('INSERT INTO contributions VALUES (?, ?, ?, ?)',
+                                   zip([document] * len(rows), rows['word'].tolist(), rows['part'].tolist(), rows['frequency'].tolist()))
+            # `WHERE true` lets SQLite parse the upsert clause after a SELECT
+            connection.execute(
+                'INSERT INTO totals SELECT word, part, frequency FROM contributions WHERE document = ? AND true '
+                'ON CONFLICT (word, part) DO UPDATE SET frequency = frequency + excluded.frequency', (document,))
+        logger.info(f"Added document '{name or doc_id}' with {len(rows)} words to the corpus index.")
+
+    def remove_document(self, doc_id: str):
+        """Subtract a document's contribution from the totals and forget it."""
+        with self._connect() as connection:
+            self._remove(connection, doc_id)
+        logger.info(f"Removed document '{doc_id}' from the corpus index.")
+
+    @staticmethod
+    def _remove(connection: sqlite3.Connection, doc_id: str):
+        row = connection.execute('SELECT id FROM documents WHERE doc_id = ?', (doc_id,)).fetchone()
+        if row is None:
+            return
+        document = row[0]
+        connection.execute(
+            'UPDATE totals SET frequency = totals.frequency - contributions.frequency FROM contributions '
+            'WHERE contributions.document = ? AND totals.word = contributions.word AND totals.part = contributions.part',
+            (document,))
+        connection.execute('DELETE FROM totals WHERE frequency <= 0')
+        connection.execute('DELETE FROM contributions WHERE document = ?', (document,))
+        connection.execute('DELETE FROM documents WHERE id = ?', (document,))
+
+    def top(self, n: Optional[int] = None, min_frequency: int = 1) -> pd.DataFrame:
+        """Return the n most frequent (word, part) pairs of the corpus, or all of them."""
+        with self._connect() as connection:
+            return pd.read_sql_query(
+                'SELECT word, part, frequency FROM totals WHERE frequency >= ? ORDER BY frequency DESC LIMIT ?',
+                connection, params=(min_frequency, -1 if n is None else n))
+
+    def documents(self) -> pd.DataFrame:
+        """Return the ingested documents, newest first."""
+        with self._connect() as connection:
+            return pd.read_sql_query('SELECT doc_id, name, added_at, words FROM documents ORDER BY added_at DESC', connection)
@@ -94,15 +94,19 @@ class DataFrameUtils:
         """
         if not dataframes:
             raise ValueError("The list of DataFrames is empty.")
-        combined_df = dataframes[0].copy()
 
-        for df in dataframes[1:]:
-            combined_df = pd.merge(combined_df, df, on=key_columns, how='outer', suffixes=('_left', '_right'))
-
-            combined_df['frequency'] = combined_df[['frequency_left', 'frequency_right']].sum(axis=1, skipna=True)
-            combined_df.drop(columns=['frequency_left', 'frequency_right'], inplace=True)
-            combined_df = combined_df[key_columns + ['frequency']]
-        combined_df.reset_index(drop=True, inplace=True)
+        # One concatenation and one aggregation instead of a merge per frame
+        combined_df = pd.concat([df[key_columns + ['frequency']] for df in dataframes], ignore_index=True)
+        part_dtype = combined_df['part'].dtype if 'part' in key_columns else None
+        if part_dtype is not None:
+            # A handful of part-of-speech tags: group on small integer codes
+            combined_df['part'] = combined_df['part'].astype('category')
+        frequency = pd.to_numeric(combined_df['frequency'], errors='coerce').fillna(0)
+        combined_df['frequency'] = frequency.astype('int64') if frequency.mod(1).eq(0).all() else frequency
+
+        combined_df = combined_df.groupby(key_columns, observed=True, dropna=False, sort=False)['frequency'].sum().reset_index()
+        if part_dtype is not None:
+            combined_df['part'] = combined_df['part'].astype(part_dtype)
 
         return combined_df[key_columns + ['frequency']]
 
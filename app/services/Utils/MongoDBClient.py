@@ -1,6 +1,6 @@
 import os
 from loguru import logger
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from typing import Optional, Dict, Any, List
 from dotenv import load_dotenv
 
@@ -43,6 +43,24 @@ class MongoDBClient:
             logger.error(f"Error finding record for '{key}': {e}")
             return None
 
+    def find_records(self, keys: List[str], collection_name: str, field_name: str,
+                     columns: Optional[List[str]] = None, batch_size: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """Find the records of many keys with batched `$in` queries. Returns key -> record, projected to `columns` if given."""
+        batch_size = batch_size or int(os.getenv('MONGO_BATCH_SIZE', 1000))
+        projection = {'_id': 0, field_name: 1, **{column: 1 for column in columns}} if columns else None
+        keys = list(dict.fromkeys(keys))
+        records = {}
+        try:
+            for start in range(0, len(keys), batch_size):
+                batch = keys[start:start + batch_size]
+                for record in self.db[collection_name].find({field_name: {'$in': batch}}, projection):
+                    # Keep the first record of a duplicated key, as find_one would
+                    records.setdefault(record[field_name], record)
+            logger.info(f"Found {len(records)} of {len(keys)} records in '{collection_name}'.")
+        except Exception as e:
+            logger.error(f"Error finding records in '{collection_name}': {e}")
+        return records
+
     def update_field(self, record: Dict[str, Any], value: Any, collection_name: str, field_name: str) -> None:
         """Update a specific field in a record."""
         try:
@@ -85,6 +103,45 @@ class MongoDBClient:
         except Exception as e:
             logger.error(f"Error inserting or updating record for '{record[field_name]}': {e}")
 
+    @staticmethod
+    def _upsert_pipeline(record: Dict[str, Any], columns: List[str], field_name: str) -> List[Dict[str, Any]]:
+        """Update pipeline with the semantics of `insert_record`: `columns` are filled only where the stored value
+        is empty, other fields are only written on insert (or where missing)."""
+        fields = {}
+        for key, value in record.items():
+            if key in (field_name, '_id'):
+                continue
+            current = f'${key}'
+            if key in columns:
+                fields[key] = {'$cond': [{'$in': [{'$ifNull': [current, None]}, [None, '', 0, False, []]]},
+                                         {'$literal': value}, current]}
+            else:
+                fields[key] = {'$ifNull': [current, {'$literal': value}]}
+        return [{'$set': fields}]
+
+    def bulk_upsert(self, records: List[Dict[str, Any]], columns: List[str],
+                    collection_name: str, field_name: str) -> None:
+        """Insert or update many records in one unordered bulk write."""
+        # One operation per key; a later record for the same key wins
+        records = list({record[field_name]: record for record in records}.values())
+        if not records:
+            return
+        operations = [
+            UpdateOne({field_name: record[field_name]}, self._upsert_pipeline(record, columns, field_name), upsert=True)
+            for record in records
+        ]
+        try:
+            result = self.db[collection_name].bulk_write(operations, ordered=False)
+            logger.info(f"Bulk upsert of {len(records)} records in '{collection_name}': "
+                        f"{result.upserted_count} inserted, {result.modified_count} updated.")
+        except Exception as e:
+            logger.error(f"Error in bulk upsert of {len(records)} records in '{collection_name}': {e}")
+
+    def bulk_writer(self, columns: List[str], collection_name: str, field_name: str,
+                    flush_size: Optional[int] = None) -> 'BulkUpsertWriter':
+        """Return a buffer that bulk-upserts records every `flush_size` records and on exit."""
+        return BulkUpsertWriter(self, columns, collection_name, field_name, flush_size)
+
     # Specific for categories
 
     def get_categories_by_word(self, key: str, collection_name: str = 'hanzi_processing') -> List[str]:
@@ -132,3 +189,32 @@ class MongoDBClient:
             logger.info("MongoDB connection closed.")
         except Exception as e:
             logger.error(f"Error closing MongoDB connection: {e}")
+
+
+class BulkUpsertWriter:
+    """Buffers records and writes them with `MongoDBClient.bulk_upsert` once `flush_size` are pending."""
+
+    def __init__(self, client: MongoDBClient, columns: List[str], collection_name: str, field_name: str,
+                 flush_size: Optional[int] = None):
+        self.client = client
+        self.columns = columns
+        self.collection_name = collection_name
+        self.field_name = field_name
+        self.flush_size = flush_size or int(os.getenv('MONGO_FLUSH_SIZE', 500))
+        self.pending: List[Dict[str, Any]] = []
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self.pending.append(record)
+        if len(self.pending) >= self.flush_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.pending:
+            self.client.bulk_upsert(self.pending, self.columns, self.collection_name, self.field_name)
+            self.pending = []
+
+    def __enter__(self) -> 'BulkUpsertWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.flush()
@@ -1,3 +1,4 @@
 from Utils.DataUtils import DataUtils, FileHandler, HSKDataFetcher, MongoDBHandler, DataFrameUtils
 from Utils.stUtils import stUtils
-from Utils.MongoDBClient import MongoDBClient
\ No newline at end of file
+from Utils.MongoDBClient import MongoDBClient
+from Utils.CorpusIndex import CorpusIndex
\ No newline at end of file
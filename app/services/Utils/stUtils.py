@@ -1,7 +1,9 @@
 import streamlit as st
 import pandas as pd
+import hashlib
 from Ankineitor import CHINESE, RECOGNITION, PHOTO_PHOTO_BASIC, RECOGNITION_REZERO
 from Utils import DataUtils
+from Utils.CorpusIndex import CorpusIndex
 
 class stUtils:
     def __init__(self) -> None:
@@ -103,20 +105,41 @@ class stUtils:
         return CONFIG
 
     def choose_dataframes(self):
+        # Uploaded CSVs are added to the persistent corpus index once, keyed by content
         df_files = st.file_uploader('Upload CSV files for DataFrames', type=['csv'], accept_multiple_files=True)
-        dfs = []
-
-        if df_files is not None:
-            for file in df_files:
-                df = pd.read_csv(file)
-                dfs.append(df)
-                st.write(f'Preview of the uploaded DataFrame from {file.name}:')
-            if dfs != []:
-                dfs_combined = DataUtils.combine_dataframes_sum_frequencies(dfs, ['word','part']).sort_values(by='frequency', ascending=False)
-                self.print_DF(dfs_combined, 'Combined DF')
-                return dfs_combined
+        index = CorpusIndex()
+
+        # Documents removed while their file is still in the uploader must not be added back on the next rerun
+        if 'removed_documents' not in self.st.session_state:
+            self.st.session_state['removed_documents'] = set()
+        removed = self.st.session_state['removed_documents']
+
+        uploads = {hashlib.sha256(file.getvalue()).hexdigest(): file for file in df_files or []}
+        # Forget removals of files taken out of the uploader, so uploading them again adds them
+        removed.intersection_update(uploads)
+        for doc_id, file in uploads.items():
+            if doc_id not in removed and not index.has_document(doc_id):
+                index.add_document(doc_id, pd.read_csv(file), name=file.name)
+                st.write(f'Added {file.name} to the corpus index.')
+
+        documents = index.documents()
+        if documents.empty:
+            return None
 
-        return None
+        to_remove = st.multiselect('Remove documents from the corpus', options=list(documents['doc_id']),
+                                   format_func=dict(zip(documents['doc_id'], documents['name'])).get)
+        if to_remove and self.create_button('Remove'):
+            for doc_id in to_remove:
+                index.remove_document(doc_id)
+                removed.add(doc_id)
+            documents = index.documents()
+            if documents.empty:
+                return None
+
+        self.print_DF(documents[['name', 'words']], 'Corpus Documents')
+        dfs_combined = index.top()
+        self.print_DF(dfs_combined, 'Combined DF')
+        return dfs_combined
 
     def choose_dataframe(self):
         # Let user upload and choose which DataFrame to use
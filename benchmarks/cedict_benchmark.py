@@ -0,0 +1,62 @@
+"""Compare per-word pinyin.get / pinyin.cedict.translate_word with CedictIndex, including
+start-up (parsing CEDICT vs loading the pickled index), and check both give the same results.
+
+Run from the repository root: python benchmarks/cedict_benchmark.py [words]
+"""
+import importlib.util
+import os
+import random
+import sys
+import tempfile
+import time
+import pinyin
+import pinyin.cedict
+
+CEDICT_INDEX = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'services', 'Processing', 'CedictIndex.py')
+
+
+def load_cedict_index():
+    """Load CedictIndex.py on its own, without the rest of the Processing package."""
+    spec = importlib.util.spec_from_file_location('CedictIndex', CEDICT_INDEX)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.CedictIndex
+
+
+def per_word(words):
+    """The previous path: one pinyin.get and one translate_word call per row."""
+    return [(pinyin.get(word, delimiter=' '), pinyin.cedict.translate_word(word)) for word in words]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    from loguru import logger
+    logger.remove()
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    CedictIndex = load_cedict_index()
+
+    _, init_time = timed(pinyin.cedict.init)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cedict_index.pkl')
+        _, build_time = timed(CedictIndex.load, path)
+        index, load_time = timed(CedictIndex.load, path)
+
+    vocabulary = list(index.glosses)
+    rng = random.Random(0)
+    # Mostly dictionary words, some unknown ones and some latin text
+    words = [rng.choice(vocabulary) if i % 10 else f'{rng.choice(vocabulary)}x{i}' for i in range(count)]
+
+    old, old_time = timed(per_word, words)
+    new, new_time = timed(index.lookup, words)
+    # Characters the pinyin data lacks now take their CEDICT reading, so those words differ on purpose
+    comparable = [all('%X' % ord(char) in pinyin.pinyin.pinyin_dict or char not in index.char_pinyin for char in word) for word in words]
+    same = [row for row, keep in zip(old, comparable) if keep] == [row for row, keep in zip(zip(new['pinyin'], new['meanings']), comparable) if keep]
+    print(f"startup: cedict.init={init_time:.2f}s index-build={build_time:.2f}s index-load={load_time:.2f}s")
+    print(f"words={count} per-word={old_time / count * 1e6:.1f}us/word lookup={new_time / count * 1e6:.2f}us/word "
+          f"speedup={old_time / new_time:.1f}x same-result={same} added-readings={comparable.count(False)}")
@@ -0,0 +1,73 @@
+"""Compare the merge-per-frame frequency combination with the concat-and-aggregate path in DataFrameUtils.
+
+Run from the repository root: python benchmarks/combine_frequencies_benchmark.py [frames] [rows]
+"""
+import importlib.util
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+DATA_UTILS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'services', 'Utils', 'DataUtils.py')
+PARTS = ['n', 'v', 'a', 'd', 'r', 'm', 'q', 'nr', 'ns', 'x']
+
+
+def load_data_frame_utils():
+    """Load DataUtils.py on its own, without the Streamlit helpers of the Utils package."""
+    spec = importlib.util.spec_from_file_location('DataUtils', DATA_UTILS)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.DataFrameUtils
+
+
+def make_frames(frames: int, rows: int, vocabulary: int = 300000):
+    """Frequency tables like the extractor's CSV exports: distinct (word, part) rows per document."""
+    rng = np.random.default_rng(0)
+    words = np.array([f'词{i}' for i in range(vocabulary)], dtype=object)
+    tables = []
+    for _ in range(frames):
+        df = pd.DataFrame({
+            'word': words[rng.integers(0, vocabulary, rows)],
+            'part': np.array(PARTS, dtype=object)[rng.integers(0, len(PARTS), rows)],
+            'frequency': rng.integers(1, 100, rows),
+        })
+        tables.append(df.drop_duplicates(subset=['word', 'part']))
+    return tables
+
+
+def merge_per_frame(dataframes, key_columns):
+    """The previous implementation: one outer merge per frame."""
+    combined_df = dataframes[0].copy()
+    for df in dataframes[1:]:
+        combined_df = pd.merge(combined_df, df, on=key_columns, how='outer', suffixes=('_left', '_right'))
+        combined_df['frequency'] = combined_df[['frequency_left', 'frequency_right']].sum(axis=1, skipna=True)
+        combined_df.drop(columns=['frequency_left', 'frequency_right'], inplace=True)
+        combined_df = combined_df[key_columns + ['frequency']]
+    combined_df.reset_index(drop=True, inplace=True)
+    return combined_df[key_columns + ['frequency']]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    from loguru import logger
+    logger.remove()
+
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    tables = make_frames(frames, rows)
+    DataFrameUtils = load_data_frame_utils()
+
+    old, old_time = timed(merge_per_frame, tables, ['word', 'part'])
+    new, new_time = timed(DataFrameUtils.combine_dataframes_sum_frequencies, tables, ['word', 'part'])
+
+    key = ['word', 'part']
+    same = old.sort_values(key).reset_index(drop=True).astype({'frequency': 'int64'}).equals(
+        new.sort_values(key).reset_index(drop=True))
+    print(f"frames={frames} rows={rows} merge-per-frame={old_time:.2f}s concat-aggregate={new_time:.2f}s "
+          f"speedup={old_time / new_time:.1f}x same-result={same}")
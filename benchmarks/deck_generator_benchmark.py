@@ -0,0 +1,121 @@
+"""Compare the per-card media/tag loop with the column-wise preparation in DeckGenerator,
+then time media staging on its own: a first build hashing every file, and a later build
+served from the process digest cache.
+
+Run from the repository root: python benchmarks/deck_generator_benchmark.py [rows] [media files]
+"""
+import os
+import sys
+import tempfile
+import time
+import random
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from services.Ankineitor import DeckGenerator
+from services.Ankineitor.media import MediaStager
+
+CONFIG = {
+    'basics': {'id': 1234567890, 'deck_title': 'bench', 'model_name': 'bench_model', 'filename': 'bench.apkg', 'note_type': 'reading'},
+    'model_fields': [{'name': 'Simplified'}, {'name': 'Pinyin'}, {'name': 'Meaning'}, {'name': 'Audio'}],
+    'model_templates': {'main': [{'name': 'Card', 'qfmt': '{{Simplified}}', 'afmt': '{{Pinyin}} {{Meaning}} {{Audio}}'}], 'css': ''},
+    'model_builder': ['word', 'pinyin', 'translation', 'audio'],
+}
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    rng = random.Random(0)
+    return pd.DataFrame({
+        'word': [f'词{i}' for i in range(rows)],
+        'pinyin': ['cí' for _ in range(rows)],
+        'translation': ['word' for _ in range(rows)],
+        'audio': [f'/opt/audio/{i}-zh.mp3' for i in range(rows)],
+        'image': [f'/opt/input/{i}.jpg' if rng.random() < 0.5 else None for i in range(rows)],
+        'categories': [', '.join(rng.sample(['HSK1', 'HSK2', 'HSK3', 'class'], 2)) for _ in range(rows)],
+        'time': ['01/01/2024' for _ in range(rows)],
+    })
+
+
+def per_card(df: pd.DataFrame):
+    """The previous implementation: one Python pass per card and media column."""
+    cards = df.to_dict(orient='index')
+    columns = list(df.columns)
+    media_columns = [col for col in columns if 'audio' in col.lower() or 'image' in col.lower()]
+    media_list = []
+    for key, entry in cards.items():
+        for media_col in media_columns:
+            if isinstance(entry.get(media_col), str):
+                filename = entry[media_col]
+                media_list.append(filename)
+                if '.mp3' in filename:
+                    cards[key][media_col] = f'[sound:{filename.split("/")[-1]}]'
+                elif '.png' in filename or '.jpg' in filename:
+                    cards[key][media_col] = filename.split("/")[-1]
+    tags = []
+    for card in cards.values():
+        card_tags = []
+        if isinstance(card.get('categories'), str):
+            card_tags.extend([f"课程:{i}" for i in card['categories'].split(', ')])
+        if isinstance(card.get('time'), str):
+            card_tags.append(f"time:{card['time']}")
+        card_tags.extend(['@AURCODE', 'reading'])
+        tags.append(card_tags)
+    return media_list, tags
+
+
+class PrestagedStager(MediaStager):
+    """Returns names staged beforehand, so the column-wise timing leaves out staging, which is timed separately."""
+
+    def __init__(self, names):
+        super().__init__()
+        self.names = names
+        self.files = {name: path for path, name in names.items()}
+
+    def stage(self, paths):
+        return self.names
+
+
+def column_wise(df: pd.DataFrame, names):
+    generator = DeckGenerator(None, CONFIG)
+    generator.media_stager = PrestagedStager(names)
+    prepared = generator._build_media_columns(df)
+    tags, _ = generator._build_tag_column(prepared)
+    return generator.media_files, tags
+
+
+def stage_media(paths):
+    """One build's staging with a fresh stager, as in every DeckGenerator."""
+    return MediaStager().stage(paths)
+
+
+def timed(fn, df, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(df)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    from loguru import logger
+    logger.remove()
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    files = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    df = make_frame(rows)
+    media = [path for col in ('audio', 'image') for path in df[col] if isinstance(path, str)]
+    names = {path: os.path.basename(path) for path in media}
+    old = timed(per_card, df)
+    new = timed(lambda df: column_wise(df, names), df)
+    print(f"rows={rows} per-card={old:.3f}s column-wise={new:.3f}s speedup={old / new:.1f}x")
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(files):
+            paths.append(os.path.join(directory, f'{i}-zh.mp3'))
+            with open(paths[-1], 'wb') as file:
+                file.write(os.urandom(16 * 1024))
+        cold = timed(stage_media, paths, repeat=1)
+        warm = timed(stage_media, paths)
+    print(f"media files={files} staging first-build={cold:.3f}s later-build={warm:.3f}s speedup={cold / warm:.1f}x")
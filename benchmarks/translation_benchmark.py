@@ -0,0 +1,61 @@
+"""Compare one-translator-per-word sequential translation with TranslationEngine, offline,
+using StubTranslator with a fixed per-request latency and failure rate.
+
+Run from the repository root: python benchmarks/translation_benchmark.py [words] [latency] [rate]
+"""
+import importlib.util
+import os
+import sys
+import time
+
+TRANSLATION_ENGINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'services', 'Processing', 'TranslationEngine.py')
+
+
+def load_translation_engine():
+    """Load TranslationEngine.py on its own, without the rest of the Processing package."""
+    spec = importlib.util.spec_from_file_location('TranslationEngine', TRANSLATION_ENGINE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def sequential(module, words, latency, failure_rate):
+    """The previous loop: a new translator for every row, no retries."""
+    results = {}
+    for word in words:
+        try:
+            results[word] = module.StubTranslator(latency=latency, failure_rate=failure_rate).translate(word)
+        except Exception:
+            results[word] = None
+    return results
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    from loguru import logger
+    logger.remove()
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0
+    failure_rate = 0.05
+    # Word lists from frequency tables repeat words across parts of speech
+    words = [f'词{i % (count * 4 // 5)}' for i in range(count)]
+
+    module = load_translation_engine()
+    engine = module.TranslationEngine(
+        translator_factory=lambda source, target: module.StubTranslator(source, target, latency, failure_rate),
+        workers=16, rate=rate, retries=3, backoff=0.01)
+
+    old, old_time = timed(sequential, module, words, latency, failure_rate)
+    new, new_time = timed(lambda: dict(engine.translate_many(words)))
+    failed_old = sum(value is None for value in old.values())
+    failed_new = sum(value is None for value in new.values())
+    print(f"words={count} distinct={len(new)} latency={latency * 1000:.0f}ms rate={rate or 'unlimited'}/s "
+          f"sequential={old_time:.2f}s ({failed_old} failed) engine={new_time:.2f}s ({failed_new} failed) "
+          f"speedup={old_time / new_time:.1f}x")
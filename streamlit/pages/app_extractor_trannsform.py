@@ -1,6 +1,6 @@
 # Broken for now, if u wanna use, back commit 794766e
 
-from Processing import TextExtractor,DataTransformer
+from Processing import TextExtractor,DataTransformer,Segmenter
 from Utils import DataUtils,stUtils
 from Ankineitor import DeckGenerator
 from dotenv import load_dotenv
@@ -9,15 +9,19 @@ import os
 load_dotenv()
 debug = os.getenv('DEBUG')
 
+# Load the jieba dictionaries once per server process, not on the first upload
+Segmenter.warm_up()
+
 def process_uploaded_files(uploaded_files, debug=False):
     """Processes uploaded files by extracting Chinese characters, applying transformations, and returning combined DataFrame."""
-    # Handle debug mode with pre-loaded files
+    # Handle debug mode with local files, streamed from disk instead of read into memory
     if debug:
-        uploaded_files = DataUtils.read_files_to_uploaded(['C://ankineitor//电路CLASSES.pdf'])
+        te = TextExtractor.from_paths(['C://ankineitor//电路CLASSES.pdf'])
+        return te.separated_chinese_characters()
 
     if uploaded_files:
         # Text extraction
-        file_data = {file.name: file.getvalue() for file in uploaded_files} if not debug else uploaded_files
+        file_data = {file.name: file.getvalue() for file in uploaded_files}
         te = TextExtractor(file_data)
         te.extract_text()
         df = te.separated_chinese_characters()
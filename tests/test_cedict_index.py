@@ -0,0 +1,37 @@
+"""CedictIndex readings: the same as pinyin.get where it works, and real readings where it does not."""
+import importlib.util
+import os
+
+import pinyin
+import pytest
+
+CEDICT_INDEX = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'services', 'Processing', 'CedictIndex.py')
+
+
+@pytest.fixture(scope='module')
+def index(tmp_path_factory):
+    # Loaded on its own, without the rest of the Processing package
+    spec = importlib.util.spec_from_file_location('CedictIndex', CEDICT_INDEX)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.CedictIndex.load(str(tmp_path_factory.mktemp('cedict') / 'cedict_index.pkl'))
+
+
+def test_matches_pinyin_get(index):
+    for word in ('中文', '学习', '绿', '女儿'):
+        assert index.pinyin(word) == pinyin.get(word, delimiter=' ')
+
+
+def test_vowelless_syllables_get_a_tone_mark(index):
+    # pinyin.get raises on these instead of returning a reading
+    with pytest.raises(RuntimeError):
+        pinyin.get('㕶')
+    assert index.pinyin('㐻') == 'ň'
+    assert index.pinyin('㕶') == 'ǹg'
+
+
+def test_characters_missing_from_pinyin_data_use_cedict(index):
+    assert pinyin.get('嗯') == '嗯'
+    assert index.pinyin('嗯') == 'ēn'
+    assert index.pinyin('呣') == 'ḿ'
+    assert index.pinyin('嗯哼') == 'ēn hēng'
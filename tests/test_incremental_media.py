@@ -0,0 +1,65 @@
+"""Incremental builds must keep every media reference pointing at the right content,
+whatever order the rows come in."""
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import zipfile
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from services.Ankineitor import DeckGenerator
+
+CONFIG = {
+    'basics': {'id': 1234567890, 'deck_title': 'test', 'model_name': 'test_model', 'filename': 'test.apkg', 'note_type': 'reading'},
+    'model_fields': [{'name': 'Simplified'}, {'name': 'Audio'}],
+    'model_templates': {'main': [{'name': 'Card', 'qfmt': '{{Simplified}}', 'afmt': '{{Audio}}'}], 'css': ''},
+    'model_builder': ['word', 'audio'],
+}
+
+
+def read_package(path):
+    """Notes (guid -> fields) and media (name -> content) of an .apkg file."""
+    with zipfile.ZipFile(path) as package, tempfile.TemporaryDirectory() as directory:
+        media = {name: package.read(member) for member, name in json.loads(package.read('media')).items()}
+        package.extract('collection.anki2', directory)
+        connection = sqlite3.connect(os.path.join(directory, 'collection.anki2'))
+        notes = {guid: flds.split('\x1f') for guid, flds in connection.execute('SELECT guid, flds FROM notes')}
+        connection.close()
+    return notes, media
+
+
+def build(df, output_file, previous=None, writer='genanki', streaming=False):
+    generator = DeckGenerator(None if streaming else df, CONFIG, writer=writer, output_file=output_file)
+    if streaming:
+        generator.generate_deck_streaming(DeckGenerator.iter_chunks(df, 1), previous)
+    else:
+        generator.generate_deck(previous)
+    return output_file
+
+
+@pytest.mark.parametrize('writer,streaming', [('genanki', False), ('bulk', False), ('genanki', True)])
+def test_reordered_incremental_build_keeps_media_content(tmp_path, writer, streaming):
+    for folder, content in (('x', b'content x'), ('y', b'content y')):
+        os.makedirs(tmp_path / folder)
+        (tmp_path / folder / 'a.mp3').write_bytes(content)
+    rows = pd.DataFrame({'word': ['你', '好'], 'audio': [str(tmp_path / 'y' / 'a.mp3'), str(tmp_path / 'x' / 'a.mp3')]})
+    expected = {'你': b'content y', '好': b'content x'}
+
+    first = build(rows, str(tmp_path / 'first.apkg'), writer=writer, streaming=streaming)
+    second = build(rows.iloc[::-1], str(tmp_path / 'second.apkg'), previous=first, writer=writer, streaming=streaming)
+
+    # Importing both packages in order: later notes replace earlier ones by GUID, later media by name
+    notes, media = {}, {}
+    for path in (first, second):
+        package_notes, package_media = read_package(path)
+        notes.update(package_notes)
+        media.update(package_media)
+
+    assert len(notes) == 2
+    for word, audio in notes.values():
+        assert media[re.fullmatch(r'\[sound:(.+)\]', audio).group(1)] == expected[word]
@@ -0,0 +1,65 @@
+"""The bulk writer must produce the same collection rows as genanki."""
+import os
+import sqlite3
+import sys
+import zipfile
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from services.Ankineitor import DeckGenerator
+
+CONFIG = {
+    'basics': {'id': 1234567890, 'deck_title': 'test', 'model_name': 'test_model', 'filename': 'test.apkg', 'note_type': 'reading'},
+    'model_fields': [{'name': 'Simplified'}, {'name': 'Pinyin'}, {'name': 'Meaning'}],
+    'model_templates': {'main': [{'name': 'Recognition', 'qfmt': '{{Simplified}}', 'afmt': '{{Pinyin}} {{Meaning}}'},
+                                 {'name': 'Recall', 'qfmt': '{{Meaning}}', 'afmt': '{{Simplified}}'}], 'css': ''},
+    'model_builder': ['word', 'pinyin', 'translation'],
+}
+
+FRAME = pd.DataFrame({
+    'word': ['你', '好', '学习', '中文'],
+    'pinyin': ['nǐ', 'hǎo', 'xué xí', 'zhōng wén'],
+    'translation': ['you', 'good', '', 'Chinese'],
+    'categories': ['HSK1', 'HSK1, HSK2', None, 'class'],
+})
+
+# Ids come from the id generator and mod from the clock, so rows are compared without them
+NOTE_COLUMNS = 'guid, mid, usn, tags, flds, sfld, csum, flags, data'
+CARD_COLUMNS = ('notes.guid, cards.did, cards.ord, cards.usn, cards.type, cards.queue, cards.due, cards.ivl, cards.factor, '
+                'cards.reps, cards.lapses, cards.left, cards.odue, cards.odid, cards.flags, cards.data')
+
+
+def collection_rows(path, tmp_path):
+    with zipfile.ZipFile(path) as package:
+        package.extract('collection.anki2', tmp_path)
+    connection = sqlite3.connect(os.path.join(tmp_path, 'collection.anki2'))
+    try:
+        notes = sorted(connection.execute(f'SELECT {NOTE_COLUMNS} FROM notes'))
+        cards = sorted(connection.execute(f'SELECT {CARD_COLUMNS} FROM cards JOIN notes ON cards.nid = notes.id'))
+    finally:
+        connection.close()
+    return notes, cards
+
+
+def test_bulk_writer_matches_genanki(tmp_path):
+    rows = {}
+    for writer in ('genanki', 'bulk'):
+        output_file = str(tmp_path / f'{writer}.apkg')
+        DeckGenerator(FRAME, CONFIG, writer=writer, output_file=output_file).generate_deck()
+        os.makedirs(tmp_path / writer)
+        rows[writer] = collection_rows(output_file, tmp_path / writer)
+
+    genanki_notes, genanki_cards = rows['genanki']
+    bulk_notes, bulk_cards = rows['bulk']
+    assert len(genanki_notes) == len(FRAME)
+    assert bulk_notes == genanki_notes
+    assert bulk_cards == genanki_cards
+
+
+def test_bulk_writer_rejects_field_count_mismatch(tmp_path):
+    config = {**CONFIG, 'model_builder': ['word', 'pinyin']}
+    generator = DeckGenerator(FRAME, config, writer='bulk', output_file=str(tmp_path / 'bulk.apkg'))
+    with pytest.raises(ValueError, match='Number of fields'):
+        generator.generate_deck()